@@ -1,171 +1,420 @@
+import hashlib
 import os
+from bisect import bisect_left
+from linediff import LineMap, line_diff
+from mappedfile import MappedLines
+from piecetable import PieceTable
+from search import SearchPattern
+from searchindex import SearchIndex
+from textfile import TextFormat, read_lines, sniff_format, write_lines
+from undo import Edit, UndoHistory, text_end
 
 class Buffer:
+    MMAP_THRESHOLD = 8 * 1024 * 1024
+    HASH_LINES = 20000
+
     def __init__(self, filename=None, read_only=False):
         self.filename = filename
-        self.lines = [""]
+        self._lines = PieceTable()
         self.clipboard = ""
-        self.undo_stack = []
-        self.redo_stack = []
+        self.history = UndoHistory()
+        self.listeners = []
+        self.version = 0
+        self.tokenizer = None
+        self.search_index = None
+        self._match_cache = None
         self.read_only = read_only
         self.diagnostics = {}
+        self.mapped = None
+        self.format = TextFormat()
+        self.disk_stamp = None
+        self.conflict = False
         if filename and os.path.exists(filename):
-            with open(filename, "r") as f:
-                self.lines = f.read().splitlines() or [""]
-                
-    def save_undo(self):
-        self.undo_stack.append([line[:] for line in self.lines])
-        if len(self.undo_stack) > 100:
-            self.undo_stack.pop(0)
-        self.redo_stack.clear()
-        
+            self.disk_stamp = self.disk_state()
+            if os.path.getsize(filename) >= self.MMAP_THRESHOLD:
+                self._map_file()
+            else:
+                self.lines, self.format = read_lines(filename)
+        self.mark_saved()
+
+    def _map_file(self):
+        self.format = sniff_format(self.filename)
+        self.mapped = MappedLines(self.filename, self.format.encoding)
+        self.mapped.ensure(1)
+        self.lines = self.mapped
+
+    def disk_state(self):
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def reload(self):
+        self.disk_stamp = self.disk_state()
+        self.conflict = False
+        if self.mapped is not None or (self.disk_stamp and self.disk_stamp[1] >= self.MMAP_THRESHOLD):
+            if self.mapped is not None and self.mapped.extend():
+                self.lines = self.mapped
+            else:
+                old = self.mapped
+                self._map_file()
+                self.diagnostics = {}
+                if old is not None:
+                    old.close()
+            self.mark_saved()
+            return None
+        new, fmt = read_lines(self.filename)
+        ops = line_diff(list(self.lines), new)
+        edits = [self._replace_lines(i1, i2, new[j1:j2]) for tag, i1, i2, j1, j2 in reversed(ops) if tag != "equal"]
+        if edits:
+            self.history.record_step(edits)
+        self.format = fmt
+        lmap = LineMap(ops)
+        diagnostics = {}
+        for y, diag in self.diagnostics.items():
+            ny, same = lmap.line(y)
+            if same:
+                diagnostics[ny] = diag
+        self.diagnostics = diagnostics
+        self.mark_saved()
+        return lmap
+
+    def _replace_lines(self, i1, i2, lines):
+        n = len(self.lines)
+        text = "\n".join(lines)
+        if i1 < i2 and (lines or i1 == 0 and i2 == n):
+            y1, x1, y2, x2 = i1, 0, i2 - 1, len(self.lines[i2 - 1])
+        elif i1 < i2 and i2 < n:
+            y1, x1, y2, x2 = i1, 0, i2, 0
+        elif i1 < i2:
+            y1, x1, y2, x2 = i1 - 1, len(self.lines[i1 - 1]), i2 - 1, len(self.lines[i2 - 1])
+        elif i1 < n:
+            y1, x1, y2, x2 = i1, 0, i1, 0
+            text += "\n"
+        else:
+            y1, x1 = y2, x2 = n - 1, len(self.lines[n - 1])
+            text = "\n" + text
+        removed = self._splice(y1, x1, y2, x2, text)
+        return Edit(y1, x1, removed, text)
+
+    @property
+    def lines(self):
+        return self._lines
+
+    @lines.setter
+    def lines(self, lines):
+        if lines is not self._lines:
+            old = len(self._lines)
+            self._lines.reset(lines)
+            self.history.clear()
+            self._notify(0, old, len(self._lines))
+
+    def _digest(self):
+        if self.mapped is not None or len(self.lines) > self.HASH_LINES:
+            return None
+        h = hashlib.blake2b(digest_size=16)
+        for line in self.lines:
+            h.update(line.encode("utf-8", "surrogatepass"))
+            h.update(b"\n")
+        return h.digest()
+
+    def mark_saved(self):
+        self.saved_version = self.version
+        self.saved_count = len(self.lines)
+        self.saved_depth = len(self.history.undo_stack)
+        self.saved_digest = self._digest()
+        self._modified = (self.version, False)
+        self.history.break_group()
+
+    @property
+    def modified(self):
+        if self.version == self.saved_version or self.read_only:
+            return False
+        if self._modified[0] != self.version:
+            modified = True
+            if (self.saved_digest is not None and len(self.history.undo_stack) == self.saved_depth
+                    and len(self.lines) == self.saved_count):
+                modified = self._digest() != self.saved_digest
+            self._modified = (self.version, modified)
+        return self._modified[1]
+
+    def _notify(self, start, old, new):
+        self.version += 1
+        for listener in self.listeners:
+            listener(start, old, new)
+
+    @property
+    def undo_stack(self):
+        return self.history.undo_stack
+
+    @property
+    def redo_stack(self):
+        return self.history.redo_stack
+
+    def _splice(self, y1, x1, y2, x2, text):
+        first = self.lines[y1]
+        last = first if y2 == y1 else self.lines[y2]
+        removed = self.get_text(y1, x1, y2, x2)
+        new = (first[:x1] + text + last[x2:]).split("\n")
+        self.lines[y1] = new[0]
+        if y2 > y1:
+            del self.lines[y1 + 1:y2 + 1]
+        if len(new) > 1:
+            self.lines.insert_lines(y1 + 1, new[1:])
+        self._notify(y1, y2 - y1 + 1, len(new))
+        return removed
+
+    def replace_text(self, y1, x1, y2, x2, text, coalesce=False):
+        removed = self._splice(y1, x1, y2, x2, text)
+        self.history.record(Edit(y1, x1, removed, text), coalesce)
+        return text_end(y1, x1, text)
+
+    def insert_text(self, y, x, text, coalesce=False):
+        return self.replace_text(y, x, y, x, text, coalesce)
+
+    def break_undo_group(self):
+        self.history.break_group()
+
+    def _inline(self, step):
+        return len(step) > 1 and not any("\n" in edit.removed or "\n" in edit.inserted for edit in step)
+
+    def _replay_inline(self, edits, forward):
+        changed = {}
+        for edit in edits:
+            old, new = (edit.removed, edit.inserted) if forward else (edit.inserted, edit.removed)
+            line = changed[edit.y] if edit.y in changed else self.lines[edit.y]
+            changed[edit.y] = line[:edit.x] + new + line[edit.x + len(old):]
+        self._set_lines(sorted(changed.items()))
+
+    def _set_lines(self, changes):
+        i = 0
+        while i < len(changes):
+            j = i + 1
+            while j < len(changes) and changes[j][0] - changes[j - 1][0] <= 64:
+                j += 1
+            first, last = changes[i][0], changes[j - 1][0]
+            if j - i == 1:
+                self.lines[first] = changes[i][1]
+            else:
+                block = self.lines[first:last + 1]
+                for y, line in changes[i:j]:
+                    block[y - first] = line
+                self.lines.insert_lines(last + 1, block)
+                self.lines.delete(first, last + 1)
+            i = j
+        if changes:
+            lo, hi = changes[0][0], changes[-1][0]
+            self._notify(lo, hi - lo + 1, hi - lo + 1)
+
     def undo(self):
-        if self.undo_stack:
-            self.redo_stack.append(self.lines)
-            self.lines = self.undo_stack.pop()
+        step = self.history.pop_undo()
+        if step is None:
+            return False
+        if self._inline(step):
+            self._replay_inline(reversed(step), False)
             return True
-        return False
-        
+        for edit in reversed(step):
+            y2, x2 = text_end(edit.y, edit.x, edit.inserted)
+            self._splice(edit.y, edit.x, y2, x2, edit.removed)
+        return True
+
     def redo(self):
-        if self.redo_stack:
-            self.undo_stack.append(self.lines)
-            self.lines = self.redo_stack.pop()
+        step = self.history.pop_redo()
+        if step is None:
+            return False
+        if self._inline(step):
+            self._replay_inline(step, True)
             return True
-        return False
-        
+        for edit in step:
+            y2, x2 = text_end(edit.y, edit.x, edit.removed)
+            self._splice(edit.y, edit.x, y2, x2, edit.inserted)
+        return True
+
     def insert_char(self, ch, cy, cx):
-        self.save_undo()
-        line = self.lines[cy]
-        self.lines[cy] = line[:cx] + chr(ch) + line[cx:]
-        
+        self.insert_text(cy, cx, chr(ch), coalesce=True)
+
     def backspace(self, cy, cx):
         if cx == 0:
             if cy == 0:
                 return cy, cx
-            self.save_undo()
             prev = self.lines[cy - 1]
-            self.lines[cy - 1] = prev + self.lines[cy]
-            self.lines.pop(cy)
+            self.replace_text(cy - 1, len(prev), cy, 0, "", coalesce=True)
             return cy - 1, len(prev)
         else:
-            self.save_undo()
-            line = self.lines[cy]
-            self.lines[cy] = line[:cx - 1] + line[cx:]
+            self.replace_text(cy, cx - 1, cy, cx, "", coalesce=True)
             return cy, cx - 1
-            
+
     def delete_char(self, cy, cx):
         line = self.lines[cy]
         if cx >= len(line):
             if cy == len(self.lines) - 1:
                 return
-            self.save_undo()
-            self.lines[cy] += self.lines[cy + 1]
-            self.lines.pop(cy + 1)
+            self.replace_text(cy, len(line), cy + 1, 0, "")
         else:
-            self.save_undo()
-            self.lines[cy] = line[:cx] + line[cx + 1:]
-            
+            self.replace_text(cy, cx, cy, cx + 1, "")
+
     def newline(self, cy, cx):
-        self.save_undo()
-        line = self.lines[cy]
-        self.lines[cy] = line[:cx]
-        self.lines.insert(cy + 1, line[cx:])
-        
+        self.insert_text(cy, cx, "\n", coalesce=True)
+
     def yank_line(self, cy):
         self.clipboard = self.lines[cy]
-        
+
     def delete_line(self, cy):
         if len(self.lines) == 1:
-            self.lines[0] = ""
+            self.replace_text(0, 0, 0, len(self.lines[0]), "")
+        elif cy < len(self.lines) - 1:
+            self.clipboard = self.lines[cy]
+            self.replace_text(cy, 0, cy + 1, 0, "")
         else:
-            self.save_undo()
-            self.clipboard = self.lines.pop(cy)
-            
+            self.clipboard = self.lines[cy]
+            self.replace_text(cy - 1, len(self.lines[cy - 1]), cy, len(self.clipboard), "")
+
     def paste(self, cy, cx):
-        self.save_undo()
-        line = self.lines[cy]
-        self.lines[cy] = line[:cx] + self.clipboard + line[cx:]
-        
+        self.insert_text(cy, cx, self.clipboard)
+
     def delete_visual(self, y1, x1, y2, x2):
-        self.save_undo()
         if (y1, x1) > (y2, x2):
             y1, x1, y2, x2 = y2, x2, y1, x1
+        x2 = min(x2 + 1, len(self.lines[y2]))
+        self.clipboard = self.get_text(y1, x1, y2, x2)
+        self.replace_text(y1, x1, y2, x2, "")
+
+    def get_text(self, y1, x1, y2, x2):
         if y1 == y2:
-            line = self.lines[y1]
-            self.clipboard = line[x1:x2 + 1]
-            self.lines[y1] = line[:x1] + line[x2 + 1:]
-        else:
-            self.clipboard = ""
-            self.clipboard += self.lines[y1][x1:] + "\n"
-            for y in range(y1 + 1, y2):
-                self.clipboard += self.lines[y] + "\n"
-            self.clipboard += self.lines[y2][:x2 + 1]
-            self.lines[y1] = self.lines[y1][:x1] + self.lines[y2][x2 + 1:]
-            for _ in range(y2, y1, -1):
-                self.lines.pop(_)
-                
+            return self.lines[y1][x1:x2]
+        middle = self.lines.iter_range(y1 + 1, y2)
+        return "\n".join([self.lines[y1][x1:], *middle, self.lines[y2][:x2]])
+
     def get_visual_clipboard(self, y1, x1, y2, x2):
         if (y1, x1) > (y2, x2):
             y1, x1, y2, x2 = y2, x2, y1, x1
-        if y1 == y2:
-            return self.lines[y1][x1:x2 + 1]
-        else:
-            ret = self.lines[y1][x1:] + "\n"
-            for y in range(y1 + 1, y2):
-                ret += self.lines[y] + "\n"
-            ret += self.lines[y2][:x2 + 1]
-            return ret
+        return self.get_text(y1, x1, y2, x2 + 1)
             
+    def enable_search_index(self):
+        if self.search_index is None:
+            self.search_index = SearchIndex(self.lines)
+            self.listeners.append(self.search_index.changed)
+        return self.search_index
+
+    def _pattern(self, query):
+        if isinstance(query, str):
+            return SearchPattern(query, regex=False)
+        return query
+
+    def _candidates(self, pattern):
+        if self.search_index is None or pattern.literal is None:
+            return [(0, len(self.lines))]
+        return self.search_index.candidates(pattern.literal)
+
+    def _clip(self, ranges, start, stop):
+        return [(max(a, start), min(b, stop)) for a, b in ranges if a < stop and b > start]
+
     def search(self, query):
-        for y, line in enumerate(self.lines):
-            x = line.find(query)
-            if x >= 0:
-                return y, x
-        return None, None
-        
+        return self.search_next(query, 0, -1)
+
     def search_next(self, query, cy, cx):
-        for y in range(cy, len(self.lines)):
-            start = cx+1 if y == cy else 0
-            x = self.lines[y].find(query, start)
-            if x >= 0:
-                return y, x
-        for y in range(0, cy):
-            x = self.lines[y].find(query)
-            if x >= 0:
-                return y, x
+        pattern = self._pattern(query)
+        self.lines.ensure()
+        ranges = self._candidates(pattern)
+        for a, b in self._clip(ranges, cy, len(self.lines)):
+            for y, line in enumerate(self.lines.iter_range(a, b), a):
+                start = cx+1 if y == cy else 0
+                x = pattern.find(line, start)
+                if x >= 0:
+                    return y, x
+        for a, b in self._clip(ranges, 0, cy):
+            for y, line in enumerate(self.lines.iter_range(a, b), a):
+                x = pattern.find(line)
+                if x >= 0:
+                    return y, x
         return None, None
 
     def search_prev(self, query, cy, cx):
-        for y in range(cy, -1, -1):
-            end = cx-1 if y == cy else len(self.lines)
-            x = self.lines[y].rfind(query, 0, end)
-            if x >= 0:
-                return y, x
-        for y in range(len(self.lines)-1, cy, -1):
-            x = self.lines[y].rfind(query)
-            if x >= 0:
-                return y, x
+        pattern = self._pattern(query)
+        self.lines.ensure()
+        ranges = self._candidates(pattern)
+        for a, b in reversed(self._clip(ranges, 0, cy + 1)):
+            for y in range(b - 1, a - 1, -1):
+                x = pattern.rfind(self.lines[y], cx if y == cy else None)
+                if x >= 0:
+                    return y, x
+        for a, b in reversed(self._clip(ranges, cy + 1, len(self.lines))):
+            for y in range(b - 1, a - 1, -1):
+                x = pattern.rfind(self.lines[y])
+                if x >= 0:
+                    return y, x
         return None, None
 
+    def match_position(self, query, y, x):
+        pattern = self._pattern(query)
+        cache = self._match_cache
+        if cache is None or cache[:2] != (pattern.key, self.version):
+            ys = []
+            cum = [0]
+            for a, b in self._candidates(pattern):
+                for i, line in enumerate(self.lines.iter_range(a, b), a):
+                    c = pattern.count(line)
+                    if c:
+                        ys.append(i)
+                        cum.append(cum[-1] + c)
+            cache = self._match_cache = (pattern.key, self.version, ys, cum)
+        _, _, ys, cum = cache
+        i = bisect_left(ys, y)
+        before = cum[i] + pattern.count(self.lines[y], x)
+        return min(before + 1, cum[-1]), cum[-1]
+
     def get_history(self):
         return self.undo_stack, self.redo_stack
         
     def save_file(self):
         if self.filename:
-            with open(self.filename, "w") as f:
-                f.write("\n".join(self.lines))
+            self.lines.ensure()
+            write_lines(self.filename, self.lines, self.format)
+            self.disk_stamp = self.disk_state()
+            self.conflict = False
+            self.mark_saved()
             return True
         return False
 
+    def substitute(self, query, repl, start=0, stop=None, count=0):
+        pattern = self._pattern(query)
+        self.lines.ensure()
+        stop = len(self.lines) if stop is None else min(stop, len(self.lines))
+        subn = pattern.regex.subn
+        literal = pattern.literal
+        edits = []
+        total = 0
+        for a, b in self._clip(self._candidates(pattern), start, stop):
+            for i, line in enumerate(self.lines.iter_range(a, b), a):
+                if literal is not None and literal not in line:
+                    continue
+                new_line, n = subn(repl, line, count)
+                if n and new_line != line:
+                    edits.append(Edit(i, 0, line, new_line))
+                    total += n
+        if edits:
+            if any("\n" in edit.inserted for edit in edits):
+                edits.reverse()
+                for edit in edits:
+                    self._splice(edit.y, 0, edit.y, len(edit.removed), edit.inserted)
+            else:
+                self._set_lines([(edit.y, edit.inserted) for edit in edits])
+            self.history.record_step(edits)
+        return total, len(edits)
+
     def replace_all(self, search, replace):
-        self.save_undo()
-        count = 0
-        for i, line in enumerate(self.lines):
-            new_line, n = line.replace(search, replace), line.count(search)
-            if n > 0:
-                self.lines[i] = new_line
-                count += n
-        return count
+        return self.substitute(search, replace.replace("\\", "\\\\"))[0]
+
+    def append_lines(self, lines):
+        start = len(self.lines)
+        self.lines.insert_lines(start, lines)
+        self._notify(start, 0, len(lines))
+
+    def drop_lines(self, start, stop):
+        del self.lines[start:stop]
+        self.lines.compact()
+        self._notify(start, stop - start, 0)
 
     def update_diagnostics(self, diagnostics):
         self.diagnostics = diagnostics
@@ -0,0 +1,71 @@
+import json
+import os
+import time
+
+CONFIG_PATH = os.path.expanduser("~/.config/tedit.json")
+
+class Config:
+    def __init__(self, path=CONFIG_PATH, keymap_path="keybindings.json", interval=1.0):
+        self.path = path
+        self.keymap_path = keymap_path
+        self.interval = interval
+        self.data = {}
+        self.keymap = {}
+        self.error = None
+        self.subscribers = []
+        self.stamp = None
+        self.last_check = 0
+        self.reload()
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _stamp(self):
+        return self._stat(self.path), self._stat(self.keymap_path)
+
+    def _read(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def reload(self):
+        self.stamp = self._stamp()
+        self.last_check = time.monotonic()
+        self.error = None
+        try:
+            if self.stamp[0] is not None:
+                self.data = self._read(self.path)
+                self.keymap = self.data
+            else:
+                self.data = {}
+                self.keymap = self._read(self.keymap_path) if self.stamp[1] is not None else {}
+        except Exception as e:
+            self.error = f"Config error: {e}"
+            return False
+        return True
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        callback(self)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def check(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_check < self.interval:
+            return False
+        self.last_check = now
+        if self._stamp() == self.stamp:
+            return False
+        self.reload()
+        for callback in list(self.subscribers):
+            callback(self)
+        return True
@@ -0,0 +1,94 @@
+import heapq
+import itertools
+import os
+import selectors
+import time
+
+class Timer:
+    __slots__ = ("when", "interval", "callback", "cancelled")
+
+    def __init__(self, when, interval, callback):
+        self.when = when
+        self.interval = interval
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class EventLoop:
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.timers = []
+        self.counter = itertools.count()
+        self.dispatched = 0
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, self._drain_wakeups)
+
+    def add_reader(self, fd, callback=None):
+        try:
+            self.selector.register(fd, selectors.EVENT_READ, callback)
+        except KeyError:
+            self.selector.modify(fd, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fd):
+        try:
+            self.selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+
+    def call_later(self, delay, callback, interval=None):
+        timer = Timer(time.monotonic() + delay, interval, callback)
+        heapq.heappush(self.timers, (timer.when, next(self.counter), timer))
+        return timer
+
+    def call_every(self, interval, callback):
+        return self.call_later(interval, callback, interval)
+
+    def wake(self):
+        try:
+            os.write(self.wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _drain_wakeups(self, fd):
+        try:
+            while os.read(fd, 4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _next_timer(self):
+        while self.timers and self.timers[0][2].cancelled:
+            heapq.heappop(self.timers)
+        return self.timers[0][0] if self.timers else None
+
+    def run_once(self, timeout=None):
+        when = self._next_timer()
+        if when is not None:
+            delay = max(0, when - time.monotonic())
+            timeout = delay if timeout is None else min(timeout, delay)
+        ready = []
+        for key, _ in self.selector.select(timeout):
+            self.dispatched += 1
+            if key.data is not None:
+                key.data(key.fd)
+            else:
+                ready.append(key.fd)
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            _, _, timer = heapq.heappop(self.timers)
+            if timer.cancelled:
+                continue
+            if timer.interval is not None:
+                timer.when = now + timer.interval
+                heapq.heappush(self.timers, (timer.when, next(self.counter), timer))
+            timer.callback()
+        return ready
+
+    def close(self):
+        self.selector.close()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
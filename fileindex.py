@@ -0,0 +1,148 @@
+import heapq
+import os
+import re
+import threading
+import time
+from itertools import compress, repeat
+from operator import contains
+
+def char_mask(text):
+    mask = 0
+    for c in set(text):
+        mask |= 1 << (ord(c) & 63)
+    return mask
+
+class FileIndex:
+    PUBLISH = 20000
+    SCORED = 5000
+
+    def __init__(self, root, ignored, interval=5.0):
+        self.root = os.path.abspath(root)
+        self.ignored = ignored
+        self.interval = interval
+        self.dirs = {}
+        self.snapshot = ([], [], [], [], 0)
+        self.generation = 0
+        self.busy = False
+        self.last_check = 0
+        self.last = None
+        self.refresh()
+
+    def __len__(self):
+        return self.snapshot[4]
+
+    def _listing(self, path, old):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if old is not None and old[0] == mtime:
+            return old
+        dirs = []
+        files = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.ignored:
+                                dirs.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        dirs.sort()
+        files.sort()
+        return mtime, dirs, files
+
+    def _run(self):
+        try:
+            self._walk()
+        finally:
+            self.busy = False
+
+    def _walk(self):
+        known = {}
+        if self.snapshot[4]:
+            paths, _, masks, _, n = self.snapshot
+            known = dict(zip(paths[:n], masks[:n]))
+        paths, lower, masks, lengths = [], [], [], []
+        self.generation += 1
+        if not known:
+            self.snapshot = (paths, lower, masks, lengths, 0)
+        dirs = {}
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            path = os.path.join(self.root, rel) if rel else self.root
+            listing = self._listing(path, self.dirs.get(path))
+            if listing is None:
+                continue
+            dirs[path] = listing
+            for name in reversed(listing[1]):
+                stack.append(os.path.join(rel, name))
+            for name in listing[2]:
+                p = os.path.join(rel, name)
+                low = p.lower()
+                mask = known.get(p)
+                paths.append(p)
+                lower.append(low)
+                masks.append(mask if mask is not None else char_mask(low))
+                lengths.append(len(p))
+            if not known and len(paths) - self.snapshot[4] >= self.PUBLISH:
+                self.snapshot = (paths, lower, masks, lengths, len(paths))
+        self.dirs = dirs
+        self.generation += 1
+        self.snapshot = (paths, lower, masks, lengths, len(paths))
+
+    def refresh(self):
+        if self.busy:
+            return False
+        self.busy = True
+        self.last_check = time.monotonic()
+        threading.Thread(target=self._run, daemon=True).start()
+        return True
+
+    def check(self, force=False):
+        if not force and time.monotonic() - self.last_check < self.interval:
+            return False
+        return self.refresh()
+
+    def rank(self, query, limit=50):
+        paths, lower, masks, lengths, n = self.snapshot
+        query = query.lower().replace(" ", "")
+        if not query:
+            return paths[:min(limit, n)], n
+        last = self.last
+        if last is not None and last[0] == self.generation and last[1] == n and query.startswith(last[2]):
+            candidates = last[3]
+        else:
+            qmask = char_mask(query)
+            candidates = list(compress(range(n), map(qmask.__eq__, map(qmask.__and__, masks))))
+        regex = re.compile(".*?".join(map(re.escape, query)))
+        matches = list(compress(candidates, map(regex.search, map(lower.__getitem__, candidates))))
+        self.last = (self.generation, n, query, matches)
+        pool = matches
+        if len(pool) > self.SCORED:
+            pool = list(compress(matches, map(contains, map(lower.__getitem__, matches), repeat(query))))
+            if len(pool) < limit:
+                pool = list(dict.fromkeys(pool + heapq.nsmallest(limit, matches, key=lengths.__getitem__)))
+            elif len(pool) > self.SCORED:
+                pool = heapq.nsmallest(self.SCORED, pool, key=lengths.__getitem__)
+
+        def score(i):
+            text = lower[i]
+            tail = text[text.rfind("/") + 1:]
+            if query in tail:
+                tier = 0
+            elif query in text:
+                tier = 1
+            elif regex.search(tail):
+                tier = 2
+            else:
+                tier = 3
+            return tier, lengths[i]
+        best = heapq.nsmallest(limit, pool, key=score)
+        return [paths[i] for i in best], len(matches)
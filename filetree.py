@@ -0,0 +1,122 @@
+import os
+import time
+
+class DirCache:
+    def __init__(self):
+        self.entries = {}
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def listing(self, path):
+        mtime = self._mtime(path)
+        cached = self.entries.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+        dirs = []
+        files = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            dirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+                    except OSError:
+                        files.append(entry.name)
+        except OSError:
+            pass
+        dirs.sort()
+        files.sort()
+        self.entries[path] = (mtime, dirs, files)
+        return dirs, files
+
+    def stale(self, path):
+        cached = self.entries.get(path)
+        return cached is None or cached[0] != self._mtime(path)
+
+class TreeRow:
+    __slots__ = ("depth", "name", "path", "is_dir")
+
+    def __init__(self, depth, name, path, is_dir):
+        self.depth = depth
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+
+class FileTree:
+    def __init__(self, root, interval=1.0):
+        self.cache = DirCache()
+        self.expanded = set()
+        self.children = {}
+        self.interval = interval
+        self.last_check = 0
+        self.rows = []
+        self.set_root(root)
+
+    def set_root(self, root):
+        self.root = os.path.abspath(root)
+        self.rebuild()
+
+    def rebuild(self):
+        rows = []
+        if self.root != os.path.abspath(os.sep):
+            rows.append(TreeRow(0, "..", os.path.dirname(self.root), True))
+        self._add_rows(rows, self.root, 0)
+        self.rows = rows
+        self.last_check = time.monotonic()
+
+    def _children(self, path, depth):
+        dirs, files = self.cache.listing(path)
+        cached = self.children.get(path)
+        if cached is None or cached[0] is not dirs or cached[1] != depth:
+            cached = self.children[path] = (
+                dirs, depth,
+                [TreeRow(depth, name, os.path.join(path, name), True) for name in dirs],
+                [TreeRow(depth, name, os.path.join(path, name), False) for name in files],
+            )
+        return cached[2], cached[3]
+
+    def _add_rows(self, rows, path, depth):
+        dirs, files = self._children(path, depth)
+        for row in dirs:
+            rows.append(row)
+            if row.path in self.expanded:
+                self._add_rows(rows, row.path, depth + 1)
+        rows.extend(files)
+
+    def label(self, row):
+        if row.name == "..":
+            return ".."
+        if row.is_dir:
+            return "  " * row.depth + ("- " if row.path in self.expanded else "+ ") + row.name + "/"
+        return "  " * row.depth + "  " + row.name
+
+    def toggle(self, row):
+        if row.path in self.expanded:
+            self.expanded.discard(row.path)
+        else:
+            self.expanded.add(row.path)
+        self.rebuild()
+
+    def parent_index(self, index):
+        row = self.rows[index]
+        for i in range(index - 1, -1, -1):
+            if self.rows[i].is_dir and self.rows[i].depth < row.depth:
+                return i
+        return index
+
+    def check(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_check < self.interval:
+            return False
+        self.last_check = now
+        dirs = [self.root] + [d for d in self.expanded if d.startswith(self.root + os.sep)]
+        if any(self.cache.stale(d) for d in dirs):
+            self.rebuild()
+            return True
+        return False
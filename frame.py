@@ -0,0 +1,113 @@
+import curses
+import time
+
+class Frame:
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.rows = [[] for _ in range(height)]
+        self.cursor = None
+        self.scroll = None
+
+    def put(self, y, x, text, attr):
+        if 0 <= y < self.height and 0 <= x < self.width:
+            self.rows[y].append((x, text, attr))
+
+    def shifted(self, top, bottom, d):
+        rows = list(self.rows)
+        for y in range(top, bottom + 1):
+            src = y + d
+            rows[y] = self.rows[src] if top <= src <= bottom else []
+        return rows
+
+class FrameWriter:
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.last = None
+        self.dirty = set()
+        self.can_scroll = curses.has_il()
+        if self.can_scroll:
+            self.stdscr.idlok(True)
+
+    def invalidate(self, y=None):
+        if y is None:
+            self.last = None
+        else:
+            self.dirty.add(y)
+
+    def paint_row(self, y, row):
+        self.stdscr.move(y, 0)
+        self.stdscr.clrtoeol()
+        for x, text, attr in row:
+            try:
+                if isinstance(text, int):
+                    self.stdscr.addch(y, x, text, attr)
+                else:
+                    self.stdscr.addstr(y, x, text, attr)
+            except curses.error:
+                pass
+
+    def scroll(self, frame):
+        last = self.last
+        if not self.can_scroll or frame.scroll is None or last.scroll is None:
+            return last.rows
+        top, bottom, first = frame.scroll
+        if (top, bottom) != last.scroll[:2]:
+            return last.rows
+        d = first - last.scroll[2]
+        if d == 0 or abs(d) > (bottom - top + 1) // 2:
+            return last.rows
+        self.stdscr.scrollok(True)
+        self.stdscr.setscrreg(top, bottom)
+        self.stdscr.scroll(d)
+        self.stdscr.setscrreg(0, frame.height - 1)
+        self.stdscr.scrollok(False)
+        return last.shifted(top, bottom, d)
+
+    def flush(self, frame):
+        last = self.last
+        if last is None or (last.height, last.width) != (frame.height, frame.width):
+            self.stdscr.erase()
+            for y, row in enumerate(frame.rows):
+                if row:
+                    self.paint_row(y, row)
+        else:
+            old_rows = self.scroll(frame)
+            for y, row in enumerate(frame.rows):
+                if y in self.dirty or row != old_rows[y]:
+                    self.paint_row(y, row)
+        self.dirty.clear()
+        if frame.cursor is not None:
+            try:
+                self.stdscr.move(*frame.cursor)
+            except curses.error:
+                pass
+        self.stdscr.noutrefresh()
+        curses.doupdate()
+        self.last = frame
+
+class FrameScheduler:
+    def __init__(self, max_fps=60, max_skip=0.25):
+        self.max_skip = max_skip
+        self.last = 0
+        self.drawn = 0
+        self.skipped = 0
+        self.set_rate(max_fps)
+
+    def set_rate(self, max_fps):
+        self.interval = 1.0 / max_fps if max_fps else 0
+
+    def wait(self):
+        return max(0, int((self.last + self.interval - time.monotonic()) * 1000))
+
+    def ready(self, keys):
+        if time.monotonic() - self.last >= self.max_skip:
+            return True
+        if keys.pending() or keys.poll(self.wait()):
+            self.skipped += 1
+            return False
+        return True
+
+    def done(self):
+        self.last = time.monotonic()
+        self.drawn += 1
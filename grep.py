@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+IGNORED_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+    ".tox", ".mypy_cache", ".pytest_cache", ".cache", "build", "dist",
+}
+BINARY_SNIFF = 8192
+HIT_RE = re.compile(r"^(.*?):(\d+):(\d+): ")
+
+_compiled = {}
+
+def _regexes(source, flags):
+    regexes = _compiled.get((source, flags))
+    if regexes is None:
+        regexes = _compiled[(source, flags)] = (re.compile(source, flags | re.MULTILINE), re.compile(source, flags))
+    return regexes
+
+def grep_files(source, flags, paths, root, per_file=200):
+    whole, regex = _regexes(source, flags)
+    out = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                data = f.read(BINARY_SNIFF)
+                if b"\0" in data:
+                    continue
+                data += f.read()
+        except OSError:
+            continue
+        text = data.decode("utf-8", "replace")
+        if not whole.search(text):
+            continue
+        rel = os.path.relpath(path, root)
+        n = 0
+        for lineno, line in enumerate(text.split("\n"), 1):
+            if line.endswith("\r"):
+                line = line[:-1]
+            m = regex.search(line)
+            if m:
+                out.append(f"{rel}:{lineno}:{m.start() + 1}: {line[:300]}")
+                n += 1
+                if n >= per_file:
+                    break
+    return out
+
+def parse_hit(line):
+    m = HIT_RE.match(line)
+    if m is None:
+        return None
+    return m.group(1), int(m.group(2)), int(m.group(3))
+
+_pool = None
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+class GrepSearch:
+    BATCH = 128
+
+    def __init__(self, root, pattern, ignored=IGNORED_DIRS, max_results=100000, wakeup=None):
+        self.root = root
+        self.wakeup = wakeup
+        self.pattern = pattern
+        self.ignored = ignored
+        self.max_results = max_results
+        self.results = queue.Queue()
+        self.files = 0
+        self.matched = set()
+        self.hits = 0
+        self.done = False
+        self.cancelled = False
+        self.pool = get_pool()
+        self.slots = threading.BoundedSemaphore((os.cpu_count() or 4) * 4)
+        self.pending = 0
+        self.lock = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _run(self):
+        try:
+            self._walk()
+        finally:
+            with self.lock:
+                while self.pending:
+                    self.lock.wait()
+            self.results.put(None)
+            if self.wakeup is not None:
+                self.wakeup()
+
+    def _walk(self):
+        batch = []
+        stack = [self.root]
+        while stack and not self.cancelled:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in self.ignored:
+                                    stack.append(entry.path)
+                            elif entry.is_file():
+                                batch.append(entry.path)
+                        except OSError:
+                            continue
+                        if len(batch) >= self.BATCH:
+                            self._submit(batch)
+                            batch = []
+            except OSError:
+                continue
+        if batch:
+            self._submit(batch)
+
+    def _submit(self, batch):
+        self.slots.acquire()
+        if self.cancelled:
+            self.slots.release()
+            return
+        with self.lock:
+            self.pending += 1
+        self.files += len(batch)
+        future = self.pool.submit(grep_files, self.pattern.pattern, self.pattern.flags, batch, self.root)
+        future.add_done_callback(self._collect)
+
+    def _collect(self, future):
+        try:
+            lines = future.result()
+        except Exception:
+            lines = []
+        if lines and not self.cancelled:
+            self.results.put(lines)
+            if self.wakeup is not None:
+                self.wakeup()
+        self.slots.release()
+        with self.lock:
+            self.pending -= 1
+            self.lock.notify_all()
+
+    def drain(self):
+        out = []
+        while True:
+            try:
+                lines = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if lines is None:
+                self.done = True
+                break
+            room = self.max_results - self.hits
+            if room <= 0:
+                self.cancel()
+                continue
+            lines = lines[:room]
+            self.hits += len(lines)
+            self.matched.update(parse_hit(line)[0] for line in lines)
+            out.extend(lines)
+        return out
@@ -0,0 +1,195 @@
+import glob
+import json
+import os
+import re
+from collections import OrderedDict
+
+class HighlightCache:
+    def __init__(self, size=8192):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return f"{self.hits} hits, {self.misses} misses, {len(self.entries)}/{self.size} entries"
+
+UNKNOWN = object()
+
+class Tokenizer:
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self.states = []
+        self.valid = 0
+        self.known = 0
+        self.breaks = set()
+
+    def changed(self, start, old, new):
+        if start < len(self.states):
+            self.states[start:start + old] = [UNKNOWN] * new
+        self.breaks = {b if b < start else b + new - old for b in self.breaks if not start <= b < start + old}
+        self.breaks.add(start + new)
+        if self.known > start:
+            self.known = max(start + new, self.known + new - old)
+        self.valid = min(self.valid, start)
+
+    def _set(self, i, state):
+        if i < len(self.states):
+            self.states[i] = state
+        else:
+            self.states.extend([UNKNOWN] * (i - len(self.states)))
+            self.states.append(state)
+
+    def _next_unknown(self, i):
+        stop = min([b for b in self.breaks if b >= i], default=self.known)
+        try:
+            return self.states.index(UNKNOWN, i, stop)
+        except ValueError:
+            return min(stop, self.known)
+
+    def state_before(self, lines, i):
+        if i == 0:
+            return None
+        if i > self.valid:
+            self._relex(lines, i)
+        return self.states[i - 1]
+
+    def _relex(self, lines, stop):
+        scan = self.lexer.scan
+        stop = min(stop, len(lines))
+        while self.valid < stop:
+            j = self.valid
+            state = self.states[j - 1] if j else None
+            for line in lines.iter_range(j, stop):
+                known = j < self.known and j < len(self.states)
+                state = scan(line, state)
+                converged = known and self.states[j] == state
+                self._set(j, state)
+                self.breaks.discard(j)
+                j += 1
+                self.valid = j
+                if converged and self.known > j:
+                    self.valid = self._next_unknown(j)
+                    break
+            if self.valid < self.known:
+                self.breaks.add(self.valid)
+            self.known = max(self.known, self.valid)
+
+TOKEN_MARKUP = {
+    "keyword": "\x01",
+    "heading": "\x01",
+    "type": "\x01",
+    "variable": "\x01",
+    "key": "\x01",
+    "comment": "\x03",
+    "code": "\x03",
+    "string": "\x04",
+    "emphasis": "\x04",
+    "number": "\x04",
+    "constant": "\x04",
+}
+
+class Language:
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.extensions = spec.get("extensions", [])
+        flags = re.IGNORECASE if spec.get("ignore_case") else 0
+        self.rules = []
+        self.group_rule = {}
+        parts = []
+        begins = []
+        group = 1
+        for i, rule in enumerate(spec["rules"]):
+            pattern = rule.get("begin", rule.get("pattern"))
+            end = re.compile(rule["end"], flags) if "begin" in rule else None
+            if end is not None:
+                begins.append(pattern)
+            parts.append(f"({pattern})")
+            self.group_rule[group] = i
+            group += 1 + re.compile(pattern, flags).groups
+            self.rules.append((TOKEN_MARKUP.get(rule.get("token"), ""), end))
+        self.matcher = re.compile("|".join(parts), flags)
+        self.hint = re.compile("|".join(begins), flags) if begins else None
+
+    def tokenize(self, line, state):
+        spans = []
+        pos = 0
+        if state is not None:
+            markup, end = self.rules[state]
+            m = end.search(line)
+            if m is None:
+                return [(0, len(line), markup)], state
+            spans.append((0, m.end(), markup))
+            pos = m.end()
+        while True:
+            for m in self.matcher.finditer(line, pos):
+                if m.end() == m.start():
+                    continue
+                rule = self.group_rule[m.lastindex]
+                markup, end = self.rules[rule]
+                if end is None:
+                    spans.append((m.start(), m.end(), markup))
+                    continue
+                e = end.search(line, m.end())
+                if e is None:
+                    spans.append((m.start(), len(line), markup))
+                    return spans, rule
+                spans.append((m.start(), e.end(), markup))
+                pos = e.end()
+                break
+            else:
+                return spans, None
+
+    def scan(self, line, state):
+        if state is None:
+            if self.hint is None or not self.hint.search(line):
+                return None
+        elif not self.rules[state][1].search(line):
+            return state
+        return self.tokenize(line, state)[1]
+
+    def highlight(self, line, state):
+        spans, _ = self.tokenize(line, state)
+        out = []
+        pos = 0
+        for start, end, markup in spans:
+            if not markup:
+                continue
+            out.append(line[pos:start])
+            out.append(f"{markup}{line[start:end]}\x02")
+            pos = end
+        out.append(line[pos:])
+        return "".join(out)
+
+def load_languages(dirs, errors=None):
+    languages = {}
+    for directory in dirs:
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            try:
+                with open(path) as f:
+                    language = Language(json.load(f))
+            except Exception as e:
+                if errors is not None:
+                    errors[path] = f"{type(e).__name__}: {e}"
+                continue
+            for ext in language.extensions:
+                languages[ext] = language
+    return languages
@@ -1,18 +1,47 @@
 import curses
-import json
 import os
+import re
+from config import Config
+from grep import parse_hit
+from linter import LintJob, lint
+from search import SearchPattern
+
+RANGE_RE = re.compile(r"(%|'<,'>|\.|\d+(?:,\d+)?)?(s\W.*|replace .*)$")
+
+def split_unescaped(text, delim):
+    parts = []
+    cur = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == "\\" and i + 1 < len(text):
+            cur.append(delim if text[i + 1] == delim else text[i:i + 2])
+            i += 2
+            continue
+        if c == delim:
+            parts.append("".join(cur))
+            cur = []
+        else:
+            cur.append(c)
+        i += 1
+    parts.append("".join(cur))
+    return parts
 
 class InputHandler:
-    def __init__(self, stdscr, buffer, cursor, renderer):
+    def __init__(self, stdscr, buffer, cursor, renderer, linter=None, config=None, getch=None):
         self.stdscr = stdscr
+        self.getch = getch or stdscr.getch
         self.buffer = buffer
         self.cursor = cursor
         self.renderer = renderer
+        self.linter = linter
+        self.config = config if config is not None else Config()
         self.mode = "NORMAL"
         self.msg = ""
         self.keymap = self.load_keybindings()
         self.last_search = None
         self.last_search_idx = None
+        self.visual_lines = None
         
     def load_keybindings(self):
         default = {
@@ -41,15 +70,7 @@ class InputHandler:
             "f3": 267,
             "delete_key": 330
         }
-        config_path = os.path.expanduser("~/.config/tedit.json")
-        if os.path.exists(config_path):
-            with open(config_path) as f:
-                usermap = json.load(f)
-                default.update(usermap)
-        elif os.path.exists("keybindings.json"):
-            with open("keybindings.json") as f:
-                usermap = json.load(f)
-                default.update(usermap)
+        default.update(self.config.keymap)
         return default
             
     def handle_insert_mode(self, k):
@@ -59,6 +80,7 @@ class InputHandler:
             return
         if k == km.get("escape", 27):
             self.mode = "NORMAL"
+            self.buffer.break_undo_group()
         elif k in (curses.KEY_BACKSPACE, 127):
             self.cursor.cy, self.cursor.cx = self.buffer.backspace(self.cursor.cy, self.cursor.cx)
             self.run_linter()
@@ -76,7 +98,8 @@ class InputHandler:
             self.buffer.newline(self.cursor.cy, self.cursor.cx)
             self.cursor.cy += 1
             self.cursor.cx = indent + extra
-            self.buffer.lines[self.cursor.cy] = ' ' * (indent + extra) + self.buffer.lines[self.cursor.cy]
+            if indent + extra:
+                self.buffer.insert_text(self.cursor.cy, 0, ' ' * (indent + extra), coalesce=True)
             self.run_linter()
         elif k == km.get("delete_key", curses.KEY_DC):
             self.buffer.delete_char(self.cursor.cy, self.cursor.cx)
@@ -96,10 +119,7 @@ class InputHandler:
             maxy, _ = self.renderer.stdscr.getmaxyx()
             self.cursor.move_cursor((maxy-1), 0)
         elif k == km.get("tab", 9):
-            self.buffer.insert_char(ord(" "), self.cursor.cy, self.cursor.cx)
-            self.buffer.insert_char(ord(" "), self.cursor.cy, self.cursor.cx+1)
-            self.buffer.insert_char(ord(" "), self.cursor.cy, self.cursor.cx+2)
-            self.buffer.insert_char(ord(" "), self.cursor.cy, self.cursor.cx+3)
+            self.buffer.insert_text(self.cursor.cy, self.cursor.cx, "    ", coalesce=True)
             self.cursor.cx += 4
             self.run_linter()
         elif 32 <= k <= 126:
@@ -109,19 +129,35 @@ class InputHandler:
         else:
             self.msg = f"Unhandled {k}"
             
+    def insert_burst(self, text):
+        if getattr(self.buffer, 'read_only', False):
+            self.msg = "Read-only buffer!"
+            return
+        self.cursor.fix_cursor()
+        self.buffer.break_undo_group()
+        self.cursor.cy, self.cursor.cx = self.buffer.insert_text(self.cursor.cy, self.cursor.cx, text)
+        self.buffer.break_undo_group()
+        self.run_linter()
+
     def handle_normal_mode(self, k):
         km = self.keymap
         if k in (10, 13) and not self.renderer.sidebar:
+            search = getattr(self.buffer, "grep", None)
+            if search is not None:
+                hit = parse_hit(self.buffer.lines[self.cursor.cy])
+                if hit is not None:
+                    path, line, _ = hit
+                    return f":e +{line} {os.path.join(search.root, path)}"
             return
         if k == ord("m"):
-            k2 = self.stdscr.getch()
+            k2 = self.getch()
             if 97 <= k2 <= 122:
                 self.cursor.marks = getattr(self.cursor, 'marks', {})
                 self.cursor.marks[chr(k2)] = (self.cursor.cy, self.cursor.cx)
                 self.msg = f"Mark {chr(k2)} set"
                 return
         if k == ord("'"):
-            k2 = self.stdscr.getch()
+            k2 = self.getch()
             if 97 <= k2 <= 122:
                 self.cursor.marks = getattr(self.cursor, 'marks', {})
                 pos = self.cursor.marks.get(chr(k2))
@@ -135,6 +171,7 @@ class InputHandler:
         if k == curses.KEY_F1:
             self.buffer.lines = self.help_text().splitlines()
             self.buffer.filename = "[HELP]"
+            self.buffer.mark_saved()
             self.cursor.cy = 0
             self.cursor.cx = 0
             self.msg = "Help opened"
@@ -152,24 +189,37 @@ class InputHandler:
                     self.renderer.sidebar_scroll = self.renderer.selected_file
                 return
             elif k == curses.KEY_DOWN:
-                self.renderer.selected_file = min(len(self.renderer.files) - 1, self.renderer.selected_file + 1)
+                self.renderer.selected_file = min(len(self.renderer.tree.rows) - 1, self.renderer.selected_file + 1)
                 maxy, _ = self.renderer.stdscr.getmaxyx()
                 sidebar_height = maxy - 1
                 if self.renderer.selected_file >= self.renderer.sidebar_scroll + sidebar_height:
                     self.renderer.sidebar_scroll = self.renderer.selected_file - sidebar_height + 1
                 return
+            elif k == curses.KEY_LEFT:
+                tree = self.renderer.tree
+                row = tree.rows[self.renderer.selected_file]
+                if row.is_dir and row.path in tree.expanded:
+                    tree.toggle(row)
+                else:
+                    self.renderer.selected_file = tree.parent_index(self.renderer.selected_file)
+                return
+            elif k == curses.KEY_RIGHT:
+                tree = self.renderer.tree
+                row = tree.rows[self.renderer.selected_file]
+                if row.is_dir and row.name != '..' and row.path not in tree.expanded:
+                    tree.toggle(row)
+                return
             elif k in (10, 13):
-                fname = self.renderer.files[self.renderer.selected_file]
-                if fname == '..' or fname.endswith('/'):
-                    if fname == '..':
-                        self.renderer.change_directory('..')
-                    else:
-                        self.renderer.change_directory(fname.rstrip('/'))
+                tree = self.renderer.tree
+                row = tree.rows[self.renderer.selected_file]
+                if row.name == '..':
+                    self.renderer.change_directory('..')
                     return
-                else:
-                    full_path = os.path.join(self.renderer.cwd, fname)
-                    self.renderer.toggle_sidebar()
-                    return f":e {full_path}"
+                if row.is_dir:
+                    tree.toggle(row)
+                    return
+                self.renderer.toggle_sidebar()
+                return f":e {row.path}"
         if k == ord(km["insert"]):
             self.mode = "INSERT"
         elif k == ord(km["left"]) or k == curses.KEY_LEFT:
@@ -187,7 +237,7 @@ class InputHandler:
         elif k == ord(km["yank"]):
             self.buffer.yank_line(self.cursor.cy)
         elif k == ord(km["delete"]):
-            k2 = self.stdscr.getch()
+            k2 = self.getch()
             if k2 == ord(km["delete"]):
                 self.buffer.delete_line(self.cursor.cy)
                 if self.cursor.cy >= len(self.buffer.lines):
@@ -216,23 +266,25 @@ class InputHandler:
             self.search()
         elif k == ord("n"):
             if self.last_search:
+                self.renderer.search_pattern = self.last_search
                 y, x = self.buffer.search_next(self.last_search, self.cursor.cy, self.cursor.cx)
                 if y is not None:
                     self.cursor.cy = y
                     self.cursor.cx = x
                     self.cursor.scroll = self.cursor.cy
-                    self.msg = f"Next: '{self.last_search}' at {y+1},{x+1}"
+                    self.msg = f"Next: '{self.last_search}' at {y+1},{x+1} ({self.match_status(y, x)})"
                 else:
                     self.msg = f"No further match for '{self.last_search}'"
             return
         elif k == ord("N"):
             if self.last_search:
+                self.renderer.search_pattern = self.last_search
                 y, x = self.buffer.search_prev(self.last_search, self.cursor.cy, self.cursor.cx)
                 if y is not None:
                     self.cursor.cy = y
                     self.cursor.cx = x
                     self.cursor.scroll = self.cursor.cy
-                    self.msg = f"Prev: '{self.last_search}' at {y+1},{x+1}"
+                    self.msg = f"Prev: '{self.last_search}' at {y+1},{x+1} ({self.match_status(y, x)})"
                 else:
                     self.msg = f"No previous match for '{self.last_search}'"
             return
@@ -262,6 +314,12 @@ class InputHandler:
         if k == ord("v"):
             self.mode = "NORMAL"
             self.cursor.visual_start = None
+        elif k == ord(":"):
+            y1, _, y2, _ = self.cursor.get_visual_range()
+            self.visual_lines = (y1, y2 + 1)
+            self.cursor.visual_start = None
+            self.mode = "NORMAL"
+            return ":'<,'>"
         elif k == ord("d"):
             vr = self.cursor.get_visual_range()
             if vr:
@@ -296,9 +354,7 @@ class InputHandler:
                 self.cursor.cx = x1
                 clip = self.buffer.clipboard
                 if clip:
-                    lines = clip.split('\n')
-                    for idx, line in enumerate(lines):
-                        self.buffer.lines.insert(self.cursor.cy + idx, line)
+                    self.buffer.insert_text(self.cursor.cy, 0, clip + '\n')
                     self.msg = "Pasted clipboard"
                 self.cursor.visual_start = None
                 self.mode = "NORMAL"
@@ -343,19 +399,15 @@ class InputHandler:
             self.buffer.show_history = True
             self.msg = "Undo/redo history shown"
             return
-        if cmd_str.startswith("replace "):
-            try:
-                _, search, replace = cmd_str.split(" ", 2)
-            except ValueError:
-                self.msg = "Usage: :replace <search> <replace>"
-                return
-            count = self.buffer.replace_all(search, replace)
-            self.msg = f"Replaced {count} occurrence(s)"
+        m = RANGE_RE.match(cmd_str)
+        if m:
+            self.substitute(m.group(1), m.group(2))
             return
         if cmd_str.startswith("goto "):
             try:
                 _, line = cmd_str.split(" ", 1)
                 line = int(line) - 1
+                self.buffer.lines.ensure(line + 1)
                 self.cursor.cy = max(0, min(line, len(self.buffer.lines)-1))
                 self.cursor.fix_cursor()
                 self.msg = f"Jumped to line {line+1}"
@@ -367,6 +419,27 @@ class InputHandler:
             self.renderer.set_theme(theme.strip())
             self.msg = f"Theme set to {theme.strip()}"
             return
+        if cmd_str == "plugins":
+            self.msg = self.renderer.plugins.status()
+            errors = self.renderer.plugins.errors()
+            if errors:
+                ext = sorted(errors)[0]
+                self.msg += f" | {ext}: {errors[ext]}"
+            errors = self.renderer.language_errors
+            if errors:
+                path = sorted(errors)[0]
+                self.msg += f" | {os.path.basename(path)}: {errors[path]}"
+            return
+        if cmd_str == "hlsearch":
+            self.renderer.hlsearch = not self.renderer.hlsearch
+            self.msg = f"Search highlighting {'on' if self.renderer.hlsearch else 'off'}"
+            return
+        if cmd_str in ("noh", "nohlsearch"):
+            self.renderer.search_pattern = None
+            return
+        if cmd_str == "hlcache":
+            self.msg = f"Highlight cache: {self.renderer.highlight_cache.stats()}"
+            return
         if cmd_str == "wrap":
             self.renderer.toggle_wrap()
             self.msg = f"Word wrap {'on' if self.renderer.wrap else 'off'}"
@@ -374,70 +447,122 @@ class InputHandler:
         if cmd_str == "help":
             self.buffer.lines = self.help_text().splitlines()
             self.buffer.filename = "[HELP]"
+            self.buffer.mark_saved()
             self.cursor.cy = 0
             self.cursor.cx = 0
             self.msg = "Help opened"
             return
         if cmd_str == "lint":
-            self.run_linter()
+            self.run_linter(0)
             self.msg = "Linter run"
             return
-        if cmd_str.startswith("!"):
-            import subprocess
-            cmd = cmd_str[1:]
-            try:
-                output = subprocess.check_output(cmd, shell=True, stderr=subprocess.STDOUT, text=True)
-            except Exception as e:
-                output = str(e)
-            self.buffer.lines = output.splitlines() or [""]
-            self.buffer.filename = f"[!{cmd}]"
-            self.cursor.cy = 0
-            self.cursor.cx = 0
-            self.msg = f"Output of !{cmd}"
-            return
         if cmd_str == "w":
-            if self.buffer.save_file():
+            if self.save():
                 self.msg = "File saved"
-            else:
-                filename = self.renderer.get_input("Save as: ")
-                if filename:
-                    self.buffer.filename = filename
-                    if self.buffer.save_file():
-                        self.msg = "File saved"
         elif cmd_str == "q":
-            if not self.buffer.undo_stack:
+            if not self.buffer.modified:
                 return "quit"
             else:
                 self.msg = "Unsaved changes! Use q! to quit without saving."
         elif cmd_str == "wq":
-            if self.buffer.save_file():
+            if self.save():
                 return "quit"
-            else:
-                filename = self.renderer.get_input("Save as: ")
-                if filename:
-                    self.buffer.filename = filename
-                    if self.buffer.save_file():
-                        return "quit"
         elif cmd_str == "q!":
             return "quit"
         else:
             self.msg = f"Unknown command: {cmd_str}"
             
+    def save(self):
+        if not self.buffer.filename:
+            filename = self.renderer.get_input("Save as: ")
+            if not filename:
+                return False
+            self.buffer.filename = filename
+        try:
+            return self.buffer.save_file()
+        except OSError as e:
+            self.msg = f"Save failed: {e.strerror or e}"
+            return False
+
+    def line_range(self, rng, default):
+        if rng is None:
+            return default
+        if rng == "%":
+            return 0, len(self.buffer.lines)
+        if rng == ".":
+            return self.cursor.cy, self.cursor.cy + 1
+        if rng == "'<,'>":
+            if self.visual_lines is None:
+                raise ValueError("No visual selection")
+            return self.visual_lines
+        first, _, last = rng.partition(",")
+        return int(first) - 1, int(last or first)
+
+    def substitute(self, rng, cmd):
+        if getattr(self.buffer, 'read_only', False):
+            self.msg = "Read-only buffer!"
+            return
+        try:
+            if cmd.startswith("replace "):
+                try:
+                    _, search, replace = cmd.split(" ", 2)
+                except ValueError:
+                    self.msg = "Usage: :replace <search> <replace>"
+                    return
+                start, stop = self.line_range(rng, (0, len(self.buffer.lines)))
+                count, lines = self.buffer.substitute(search, replace.replace("\\", "\\\\"), start, stop)
+            else:
+                parts = split_unescaped(cmd[2:], cmd[1])
+                if len(parts) > 3:
+                    self.msg = "Usage: :[range]s/pattern/replacement/[gi]"
+                    return
+                search = parts[0]
+                repl = parts[1] if len(parts) > 1 else ""
+                flags = parts[2] if len(parts) > 2 else ""
+                if search:
+                    pattern = SearchPattern(search, ignore_case="i" in flags or self.config.get("ignorecase", False))
+                elif self.last_search is not None:
+                    pattern = self.last_search
+                else:
+                    self.msg = "No previous search pattern"
+                    return
+                start, stop = self.line_range(rng, (self.cursor.cy, self.cursor.cy + 1))
+                count, lines = self.buffer.substitute(pattern, repl, start, stop, 0 if "g" in flags else 1)
+        except (re.error, ValueError, IndexError) as e:
+            self.msg = f"Replace failed: {e}"
+            return
+        if count:
+            self.msg = f"Replaced {count} occurrence(s) on {lines} line(s)"
+            self.cursor.fix_cursor()
+            self.run_linter()
+        else:
+            self.msg = "Pattern not found"
+
     def search(self):
         s = self.renderer.get_input("Search: ")
         if not s:
             return
-        y, x = self.buffer.search(s)
+        try:
+            pattern = SearchPattern(s, ignore_case=self.config.get("ignorecase", False))
+        except re.error as e:
+            self.msg = f"Bad pattern '{s}': {e}"
+            return
+        self.renderer.search_pattern = pattern
+        y, x = self.buffer.search(pattern)
         if y is not None:
             self.cursor.cy = y
             self.cursor.cx = x
             self.cursor.scroll = self.cursor.cy
-            self.last_search = s
+            self.last_search = pattern
             self.last_search_idx = (y, x)
-            self.msg = f"Found '{s}' at {y+1},{x+1}"
+            self.msg = f"Found '{s}' at {y+1},{x+1} ({self.match_status(y, x)})"
         else:
             self.msg = f"'{s}' not found"
 
+    def match_status(self, y, x):
+        k, total = self.buffer.match_position(self.last_search, y, x)
+        return f"match {k:,} of {total:,}"
+
     def help_text(self):
         return """
 Tedit Help
@@ -463,7 +588,8 @@ Normal mode keys:
   :goto <n> - jump to line
   :theme <t> - set theme
   :wrap     - toggle word wrap
-  :!cmd     - run shell command
+  :!cmd     - run shell command (output streams into a new buffer)
+  :stop     - cancel the command or grep in this buffer (or Ctrl-C)
   ma/'a     - set/jump mark a
   Tab       - switch split focus
 
@@ -471,114 +597,13 @@ Visual mode: d/y/p/h/j/k/l, PgUp/PgDn
 Insert mode: Esc to normal, arrows, PgUp/PgDn
 """
 
-    def run_linter(self):
-        import subprocess
-        import re
-        config_path = os.path.expanduser("~/.config/tedit.json")
-        linter_cmd = None
-        markdown_linter_cmd = None
-        if os.path.exists(config_path):
-            try:
-                with open(config_path) as f:
-                    cfg = json.load(f)
-                linter_cmd = cfg.get("linter_cmd")
-                markdown_linter_cmd = cfg.get("markdown_linter_cmd")
-            except Exception:
-                pass
-        diagnostics = {}
-        filetype = self.buffer.filename or ''
-        ext = os.path.splitext(filetype)[-1].lstrip('.') if filetype else ''
-        custom_linter = None
-        if hasattr(self.renderer, 'get_external_linter'):
-            custom_linter = self.renderer.get_external_linter(ext)
-        if custom_linter:
-            try:
-                diagnostics = custom_linter(self.buffer.lines, filetype)
-            except Exception as e:
-                self.msg = f"Custom linter error: {e}"
-        elif filetype.endswith('.py') and not linter_cmd:
-            try:
-                compile('\n'.join(self.buffer.lines) + '\n', '<string>', 'exec')
-            except SyntaxError as e:
-                lineno = getattr(e, 'lineno', 1) - 1
-                diagnostics.setdefault(lineno, []).append(("error", str(e)))
-            todo_re = re.compile(r"#.*(TODO|FIXME)", re.IGNORECASE)
-            for i, line in enumerate(self.buffer.lines):
-                for m in todo_re.finditer(line):
-                    kind = "todo" if "todo" in m.group(1).lower() else "warning"
-                    diagnostics.setdefault(i, []).append((kind, m.group(0)))
-        elif filetype.endswith('.md') or filetype.endswith('.markdown'):
-            cmd = markdown_linter_cmd or "markdownlint {file}"
-            if self.buffer.filename and os.path.exists(self.buffer.filename):
-                try:
-                    proc = subprocess.run(cmd.format(file=self.buffer.filename), shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-                    out = proc.stdout
-                    if out:
-                        for l in out.splitlines():
-                            m = re.match(r"([^:]+):(\d+) (MD\d+)(?:/(.*?))? (.*)", l)
-                            if m:
-                                lineno = int(m.group(2)) - 1
-                                rule = m.group(3)
-                                msg = m.group(5)
-                                diagnostics.setdefault(lineno, []).append(("error", f"{rule}: {msg}"))
-                            else:
-                                m2 = re.match(r".*:(\d+):(\d+): (error|warning|info): (.*)", l)
-                                if m2:
-                                    lineno = int(m2.group(1)) - 1
-                                    kind = m2.group(3)
-                                    msg = m2.group(4)
-                                    diagnostics.setdefault(lineno, []).append((kind, msg))
-                    else:
-                        if proc.returncode != 0:
-                            self.msg = f"Markdown linter error: {proc.stdout.strip()}"
-                        for i, line in enumerate(self.buffer.lines):
-                            if not line.strip():
-                                continue
-                            if not line.startswith('#') and not line.startswith(' '):
-                                diagnostics.setdefault(i, []).append(("info", "Not a heading or indented"))
-                        todo_re = re.compile(r"(TODO|FIXME)", re.IGNORECASE)
-                        for i, line in enumerate(self.buffer.lines):
-                            for m in todo_re.finditer(line):
-                                kind = "todo" if "todo" in m.group(1).lower() else "warning"
-                                diagnostics.setdefault(i, []).append((kind, m.group(0)))
-                except Exception as e:
-                    self.msg = f"Markdown linter error: {e}"
-                    for i, line in enumerate(self.buffer.lines):
-                        if not line.strip():
-                            continue
-                        if not line.startswith('#') and not line.startswith(' '):
-                            diagnostics.setdefault(i, []).append(("info", "Not a heading or indented"))
-                        todo_re = re.compile(r"(TODO|FIXME)", re.IGNORECASE)
-                        for i, line in enumerate(self.buffer.lines):
-                            for m in todo_re.finditer(line):
-                                kind = "todo" if "todo" in m.group(1).lower() else "warning"
-                                diagnostics.setdefault(i, []).append((kind, m.group(0)))
-            else:
-                for i, line in enumerate(self.buffer.lines):
-                    if not line.strip():
-                        continue
-                    if not line.startswith('#') and not line.startswith(' '):
-                        diagnostics.setdefault(i, []).append(("info", "Not a heading or indented"))
-                todo_re = re.compile(r"(TODO|FIXME)", re.IGNORECASE)
-                for i, line in enumerate(self.buffer.lines):
-                    for m in todo_re.finditer(line):
-                        kind = "todo" if "todo" in m.group(1).lower() else "warning"
-                        diagnostics.setdefault(i, []).append((kind, m.group(0)))
-        elif linter_cmd and self.buffer.filename:
-            try:
-                proc = subprocess.run(linter_cmd.format(file=self.buffer.filename), shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-                out = proc.stdout
-                if out:
-                    for l in out.splitlines():
-                        m = re.match(r".*:(\d+):(\d+): (error|warning|info): (.*)", l)
-                        if m:
-                            lineno = int(m.group(1)) - 1
-                            kind = m.group(3)
-                            msg = m.group(4)
-                            diagnostics.setdefault(lineno, []).append((kind, msg))
-                else:
-                    if proc.returncode != 0:
-                        self.msg = f"Linter error: {proc.stdout.strip()}"
-            except Exception as e:
-                self.msg = f"Linter error: {e}"
-        self.buffer.update_diagnostics(diagnostics)
\ No newline at end of file
+    def run_linter(self, delay=None):
+        if self.linter is not None:
+            self.linter.schedule(self, delay)
+            return
+        ext = os.path.splitext(self.buffer.filename)[-1].lstrip('.') if self.buffer.filename else ''
+        job = LintJob(self.buffer, self.buffer.version, list(self.buffer.lines), self.buffer.filename, self.renderer.get_external_linter(ext))
+        diagnostics, msg = lint(job, self.config.data)
+        if msg:
+            self.msg = msg
+        self.buffer.update_diagnostics(diagnostics)
@@ -0,0 +1,97 @@
+import sys
+from collections import deque
+
+PASTE_START = (27, 91, 50, 48, 48, 126)
+PASTE_END = (27, 91, 50, 48, 49, 126)
+TEXT_KEYS = frozenset(range(32, 127))
+
+class KeyReader:
+    def __init__(self, stdscr, limit=1 << 20, paste_timeout=200):
+        self.stdscr = stdscr
+        self.limit = limit
+        self.paste_timeout = paste_timeout
+        self.queue = deque()
+
+    def set_bracketed_paste(self, enabled):
+        sys.stdout.write("\x1b[?2004h" if enabled else "\x1b[?2004l")
+        sys.stdout.flush()
+
+    def pending(self):
+        return bool(self.queue)
+
+    def poll(self, timeout=0):
+        if not self.queue:
+            k = self._read(timeout)
+            if k != -1:
+                self.queue.append(k)
+                self._drain()
+        return bool(self.queue)
+
+    def get(self, timeout=-1):
+        if not self.poll(timeout):
+            return -1
+        return self.queue.popleft()
+
+    def getch(self, timeout=-1):
+        k = self.get(timeout)
+        if isinstance(k, str):
+            if len(k) > 1:
+                self.queue.appendleft(k[1:])
+            k = ord(k[0])
+        return k
+
+    def take_text(self):
+        out = []
+        while self.queue and self.queue[0] in TEXT_KEYS and len(out) < self.limit:
+            out.append(chr(self.queue.popleft()))
+        return "".join(out)
+
+    def _read(self, timeout):
+        self.stdscr.timeout(timeout)
+        try:
+            return self.stdscr.getch()
+        finally:
+            self.stdscr.timeout(-1)
+
+    def _drain(self):
+        while len(self.queue) < self.limit:
+            k = self._read(0)
+            if k == -1:
+                break
+            self.queue.append(k)
+        if 27 in self.queue:
+            self._parse_pastes()
+
+    def _find(self, keys, seq, start=0):
+        n = len(seq)
+        for i in range(start, len(keys) - n + 1):
+            if keys[i] == seq[0] and tuple(keys[i:i + n]) == seq:
+                return i
+        return -1
+
+    def _parse_pastes(self):
+        keys = list(self.queue)
+        out = []
+        pos = 0
+        while True:
+            start = self._find(keys, PASTE_START, pos)
+            if start == -1:
+                out.extend(keys[pos:])
+                break
+            out.extend(keys[pos:start])
+            body = start + len(PASTE_START)
+            end = self._find(keys, PASTE_END, body)
+            while end == -1:
+                k = self._read(self.paste_timeout)
+                if k == -1:
+                    end = len(keys)
+                    break
+                keys.append(k)
+                if k == PASTE_END[-1]:
+                    end = self._find(keys, PASTE_END, max(body, len(keys) - len(PASTE_END)))
+            data = bytes(k for k in keys[body:end] if 0 <= k < 256)
+            text = data.decode("utf-8", "replace").replace("\r\n", "\n").replace("\r", "\n")
+            if text:
+                out.append(text)
+            pos = min(len(keys), end + len(PASTE_END))
+        self.queue = deque(out)
@@ -0,0 +1,34 @@
+from bisect import bisect_right
+from difflib import SequenceMatcher
+
+def line_diff(a, b):
+    n = min(len(a), len(b))
+    p = 0
+    while p < n and a[p] == b[p]:
+        p += 1
+    s = 0
+    while s < n - p and a[len(a) - 1 - s] == b[len(b) - 1 - s]:
+        s += 1
+    ops = []
+    if p:
+        ops.append(("equal", 0, p, 0, p))
+    middle = SequenceMatcher(None, a[p:len(a) - s], b[p:len(b) - s]).get_opcodes()
+    ops.extend((tag, i1 + p, i2 + p, j1 + p, j2 + p) for tag, i1, i2, j1, j2 in middle)
+    if s:
+        ops.append(("equal", len(a) - s, len(a), len(b) - s, len(b)))
+    return ops
+
+class LineMap:
+    def __init__(self, ops):
+        self.ops = ops
+        self.ends = [op[2] for op in ops]
+
+    def line(self, y):
+        k = bisect_right(self.ends, y)
+        if k >= len(self.ops):
+            last = self.ops[-1] if self.ops else ("equal", 0, 0, 0, 0)
+            return max(0, last[4] - 1), False
+        tag, i1, i2, j1, j2 = self.ops[k]
+        if tag == "equal":
+            return j1 + y - i1, True
+        return min(j1 + y - i1, max(j1, j2 - 1)), False
@@ -0,0 +1,234 @@
+import os
+import queue
+import re
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+
+TODO_RE = re.compile(r"#.*(TODO|FIXME)", re.IGNORECASE)
+MD_TODO_RE = re.compile(r"(TODO|FIXME)", re.IGNORECASE)
+MD_RULE_RE = re.compile(r"([^:]+):(\d+) (MD\d+)(?:/(.*?))? (.*)")
+DIAGNOSTIC_RE = re.compile(r".*:(\d+):(\d+): (error|warning|info): (.*)")
+
+class Cancelled(Exception):
+    pass
+
+class LintJob:
+    def __init__(self, buffer, version, lines, filename, custom_linter):
+        self.buffer = buffer
+        self.version = version
+        self.lines = lines
+        self.filename = filename
+        self.custom_linter = custom_linter
+        self.proc = None
+        self.cancelled = False
+
+    def run_command(self, template):
+        if self.cancelled:
+            raise Cancelled()
+        text = "\n".join(self.lines) + "\n"
+        path = None
+        try:
+            if "{file}" in template:
+                name = os.path.basename(self.filename or "buffer")
+                fd, path = tempfile.mkstemp(prefix="tedit-", suffix="-" + name)
+                with os.fdopen(fd, "w", encoding="utf-8", errors="surrogateescape") as f:
+                    f.write(text)
+                text = None
+            argv = shlex.split(template)
+            if path is not None:
+                argv = [arg.replace("{file}", path) for arg in argv]
+            stdin = subprocess.DEVNULL if text is None else subprocess.PIPE
+            try:
+                self.proc = subprocess.Popen(argv, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace")
+            except FileNotFoundError:
+                return 127, f"{argv[0]}: command not found\n"
+            if self.cancelled:
+                self.proc.kill()
+            out, _ = self.proc.communicate(text)
+        finally:
+            if path is not None:
+                os.unlink(path)
+        if self.cancelled:
+            raise Cancelled()
+        return self.proc.returncode, out
+
+    def cancel(self):
+        self.cancelled = True
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+def _markdown_fallback(lines, diagnostics):
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+        if not line.startswith('#') and not line.startswith(' '):
+            diagnostics.setdefault(i, []).append(("info", "Not a heading or indented"))
+    for i, line in enumerate(lines):
+        for m in MD_TODO_RE.finditer(line):
+            kind = "todo" if "todo" in m.group(1).lower() else "warning"
+            diagnostics.setdefault(i, []).append((kind, m.group(0)))
+
+def has_linter(filename, custom_linter, cfg):
+    if custom_linter:
+        return True
+    if not filename:
+        return False
+    if filename.endswith(('.py', '.md', '.markdown')):
+        return True
+    return bool(cfg.get("linter_cmd"))
+
+def lint(job, cfg):
+    linter_cmd = cfg.get("linter_cmd")
+    markdown_linter_cmd = cfg.get("markdown_linter_cmd")
+    lines = job.lines
+    filetype = job.filename or ''
+    diagnostics = {}
+    msg = ""
+    if job.custom_linter:
+        try:
+            diagnostics = job.custom_linter(lines, filetype)
+        except Exception as e:
+            msg = f"Custom linter error: {e}"
+    elif filetype.endswith('.py') and not linter_cmd:
+        try:
+            compile('\n'.join(lines) + '\n', '<string>', 'exec')
+        except SyntaxError as e:
+            lineno = (getattr(e, 'lineno', 1) or 1) - 1
+            diagnostics.setdefault(lineno, []).append(("error", str(e)))
+        for i, line in enumerate(lines):
+            for m in TODO_RE.finditer(line):
+                kind = "todo" if "todo" in m.group(1).lower() else "warning"
+                diagnostics.setdefault(i, []).append((kind, m.group(0)))
+    elif filetype.endswith('.md') or filetype.endswith('.markdown'):
+        cmd = markdown_linter_cmd or "markdownlint {file}"
+        if job.filename:
+            try:
+                returncode, out = job.run_command(cmd)
+                if out:
+                    for l in out.splitlines():
+                        m = MD_RULE_RE.match(l)
+                        if m:
+                            lineno = int(m.group(2)) - 1
+                            diagnostics.setdefault(lineno, []).append(("error", f"{m.group(3)}: {m.group(5)}"))
+                        else:
+                            m2 = DIAGNOSTIC_RE.match(l)
+                            if m2:
+                                lineno = int(m2.group(1)) - 1
+                                diagnostics.setdefault(lineno, []).append((m2.group(3), m2.group(4)))
+                else:
+                    if returncode != 0:
+                        msg = "Markdown linter error"
+                    _markdown_fallback(lines, diagnostics)
+            except Cancelled:
+                raise
+            except Exception as e:
+                msg = f"Markdown linter error: {e}"
+                _markdown_fallback(lines, diagnostics)
+        else:
+            _markdown_fallback(lines, diagnostics)
+    elif linter_cmd and job.filename:
+        try:
+            returncode, out = job.run_command(linter_cmd)
+            if out:
+                for l in out.splitlines():
+                    m = DIAGNOSTIC_RE.match(l)
+                    if m:
+                        lineno = int(m.group(1)) - 1
+                        diagnostics.setdefault(lineno, []).append((m.group(3), m.group(4)))
+            elif returncode != 0:
+                msg = "Linter error"
+        except Cancelled:
+            raise
+        except Exception as e:
+            msg = f"Linter error: {e}"
+    return diagnostics, msg
+
+class Linter:
+    def __init__(self, delay=0.3, workers=None, wakeup=None):
+        self.delay = delay
+        self.wakeup = wakeup
+        self.settings = {}
+        self.pending = {}
+        self.running = {}
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        for _ in range(workers or os.cpu_count() or 4):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def configure(self, config):
+        self.settings = config.data
+        self.delay = config.get("lint_delay", 300) / 1000
+
+    def schedule(self, handler, delay=None):
+        if delay is None:
+            delay = self.delay
+        self.pending[handler] = time.monotonic() + delay
+        job = self.running.get(handler.buffer)
+        if job is not None:
+            job.cancel()
+
+    def poll(self):
+        now = time.monotonic()
+        for handler, due in list(self.pending.items()):
+            if due <= now:
+                del self.pending[handler]
+                self._submit(handler)
+        while True:
+            try:
+                handler, job, diagnostics, msg = self.results.get_nowait()
+            except queue.Empty:
+                break
+            with self.lock:
+                if self.running.get(job.buffer) is job:
+                    del self.running[job.buffer]
+            if job.version == job.buffer.version:
+                job.buffer.update_diagnostics(diagnostics)
+                if msg:
+                    handler.msg = msg
+
+    def timeout(self):
+        if self.pending:
+            wait = min(self.pending.values()) - time.monotonic()
+            return max(0, int(wait * 1000))
+        if self.running and self.wakeup is None:
+            return 50
+        return -1
+
+    def _submit(self, handler):
+        buffer = handler.buffer
+        if buffer.mapped is not None:
+            return
+        ext = os.path.splitext(buffer.filename)[-1].lstrip('.') if buffer.filename else ''
+        custom_linter = handler.renderer.get_external_linter(ext)
+        if not has_linter(buffer.filename, custom_linter, self.settings):
+            return
+        job = LintJob(buffer, buffer.version, list(buffer.lines), buffer.filename, custom_linter)
+        with self.lock:
+            old = self.running.get(buffer)
+            if old is not None:
+                old.cancel()
+            self.running[buffer] = job
+        self.jobs.put((handler, job, self.settings))
+
+    def _work(self):
+        while True:
+            handler, job, settings = self.jobs.get()
+            if job.cancelled:
+                continue
+            try:
+                diagnostics, msg = lint(job, settings)
+            except Cancelled:
+                continue
+            except Exception as e:
+                diagnostics, msg = {}, f"Linter error: {e}"
+            self.results.put((handler, job, diagnostics, msg))
+            if self.wakeup is not None:
+                self.wakeup()
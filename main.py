@@ -3,11 +3,22 @@ import curses
 import sys
 import os
 import json
+import re
+import signal
 import time
 from buffer import Buffer
+from config import Config
+from eventloop import EventLoop
 from cursor import Cursor
+from fileindex import FileIndex
+from frame import FrameScheduler
 from renderer import Renderer
 from inputhandler import InputHandler
+from keyinput import TEXT_KEYS, KeyReader
+from grep import IGNORED_DIRS, GrepSearch
+from linter import Linter
+from search import SearchPattern
+from shellcmd import ShellCommand
 
 class Tedit:
     def __init__(self, stdscr, *args):
@@ -18,7 +29,17 @@ class Tedit:
         self.cursors = []
         self.input_handlers = []
         self.current = 0
-        self.renderer = Renderer(stdscr)
+        self.config = Config()
+        self.renderer = Renderer(stdscr, self.config)
+        self.keys = KeyReader(stdscr)
+        self.loop = EventLoop()
+        self.loop.add_reader(sys.stdin.fileno())
+        self.renderer.getch = self.read_key
+        self.resized = False
+        signal.signal(signal.SIGWINCH, self.on_resize)
+        signal.signal(signal.SIGINT, self.on_interrupt)
+        self.frames = FrameScheduler()
+        self.redraw = True
         self.split_mode = None
         self.split_buffers = None
         self.split_focus = 0
@@ -26,15 +47,11 @@ class Tedit:
         filenames = [a for a in args if not a.startswith('--')]
         self.session_path = os.path.expanduser("~/.config/tedit.session")
         self.last_autosave = time.time()
-        self.config = {}
-        config_path = os.path.expanduser("~/.config/tedit.json")
-        if os.path.exists(config_path):
-            try:
-                with open(config_path) as f:
-                    self.config = json.load(f)
-            except Exception:
-                self.config = {}
-        self.autosave_enabled = self.config.get("autosave", False)
+        self.linter = Linter(workers=self.config.get("lint_workers"), wakeup=self.loop.wake)
+        self.config.subscribe(self.linter.configure)
+        self.config.subscribe(self.configure)
+        self.file_index = FileIndex(self.renderer.cwd, self.ignored_dirs())
+        self.conflicts = []
         if not os.path.exists(os.path.dirname(self.session_path)):
             os.makedirs(os.path.dirname(self.session_path), exist_ok=True)
         if not self.no_session and os.path.exists(self.session_path):
@@ -44,7 +61,17 @@ class Tedit:
                 self.open_buffer(fname)
         else:
             self.open_buffer(None)
-        self.run()
+        errors = self.renderer.language_errors
+        if errors:
+            path = sorted(errors)[0]
+            self.input_handlers[self.current].msg = f"Bad language file {os.path.basename(path)}: {errors[path]}"
+        self.loop.call_every(1.0, self.housekeeping)
+        self.keys.set_bracketed_paste(True)
+        try:
+            self.run()
+        finally:
+            self.keys.set_bracketed_paste(False)
+            self.loop.close()
 
     def open_buffer(self, filename, cy=0, cx=0, read_only=False):
         buf = Buffer(filename)
@@ -52,15 +79,192 @@ class Tedit:
         cur = Cursor(buf.lines)
         cur.cy = cy
         cur.cx = cx
-        handler = InputHandler(self.stdscr, buf, cur, self.renderer)
+        handler = InputHandler(self.stdscr, buf, cur, self.renderer, self.linter, self.config, self.getch)
         self.buffers.append(buf)
         self.cursors.append(cur)
         self.input_handlers.append(handler)
         self.current = len(self.buffers) - 1
+        handler.run_linter(0)
+
+    def configure(self, config):
+        self.autosave_enabled = config.get("autosave", False)
+        self.search_index_lines = config.get("search_index_lines", 100000)
+        self.frames.set_rate(config.get("max_fps", 60))
+        for handler in self.input_handlers:
+            handler.keymap = handler.load_keybindings()
+        if config.error and self.input_handlers:
+            self.input_handlers[self.current].msg = config.error
+
+    def edit(self, arg):
+        arg = arg.strip()
+        cy = 0
+        if arg.startswith("+"):
+            num, _, arg = arg[1:].partition(" ")
+            arg = arg.strip()
+            if num.isdigit():
+                cy = max(0, int(num) - 1)
+        path = os.path.abspath(arg)
+        for i, buf in enumerate(self.buffers):
+            if buf.filename and not buf.filename.startswith("[") and os.path.abspath(buf.filename) == path:
+                self.current = i
+                self.cursors[i].cy = cy
+                self.cursors[i].cx = 0
+                self.cursors[i].fix_cursor()
+                self.input_handlers[i].msg = f"Switched to {arg}"
+                return
+        self.open_buffer(arg, cy)
+        self.input_handlers[self.current].msg = f"Opened {arg}"
+
+    def ignored_dirs(self):
+        return IGNORED_DIRS | set(self.config.get("grep_ignore", []))
+
+    def find(self, query, handler):
+        index = self.file_index
+        if index.root != os.path.abspath(self.renderer.cwd):
+            index = self.file_index = FileIndex(self.renderer.cwd, self.ignored_dirs())
+        else:
+            index.check(force=True)
+        selected = 0
+        ranked = None
+        results, total = [], 0
+        while True:
+            maxy, _ = self.stdscr.getmaxyx()
+            key = (query, len(index), index.generation, maxy)
+            if key != ranked:
+                ranked = key
+                results, total = index.rank(query, max(1, maxy - 1))
+                selected = min(selected, max(0, len(results) - 1))
+            status = f"{total:,}/{len(index):,}" + (" indexing..." if index.busy else "")
+            self.renderer.draw_picker(query, results, selected, status)
+            k = self.read_key(100 if index.busy else -1)
+            if isinstance(k, str):
+                query += k.split("\n", 1)[0]
+                selected = 0
+                continue
+            if k == 27:
+                handler.msg = "Find cancelled"
+                return
+            if k in (10, 13):
+                if results:
+                    self.edit(os.path.join(index.root, results[selected]))
+                return
+            if k == curses.KEY_UP:
+                selected = min(len(results) - 1, selected + 1)
+            elif k == curses.KEY_DOWN:
+                selected = max(0, selected - 1)
+            elif k in (8, 127, curses.KEY_BACKSPACE):
+                query = query[:-1]
+                selected = 0
+            elif 32 <= k <= 126:
+                query += chr(k)
+                selected = 0
+
+    def grep(self, pattern, handler):
+        pattern = pattern.strip()
         try:
-            handler.run_linter()
-        except Exception:
-            pass
+            regex = SearchPattern(pattern, ignore_case=self.config.get("ignorecase", False)).regex
+        except re.error as e:
+            handler.msg = f"Bad pattern '{pattern}': {e}"
+            return
+        root = self.renderer.cwd
+        ignored = self.ignored_dirs()
+        self.open_buffer(None)
+        buf = self.buffers[self.current]
+        buf.filename = f"[grep {pattern}]"
+        buf.read_only = True
+        buf.lines = [f"grep '{pattern}' in {root}"]
+        buf.grep = GrepSearch(root, regex, ignored, self.config.get("grep_max_results", 100000), self.loop.wake)
+        self.input_handlers[self.current].msg = "Searching..."
+
+    def poll_greps(self):
+        for buf, handler in zip(self.buffers, self.input_handlers):
+            search = getattr(buf, "grep", None)
+            if search is None or search.done:
+                continue
+            lines = search.drain()
+            if lines:
+                buf.append_lines(lines)
+            if search.done:
+                handler.msg = f"{search.hits:,} matches in {len(search.matched):,} files ({search.files:,} scanned)"
+
+    def shell(self, cmd, handler):
+        cmd = cmd.strip()
+        if not cmd:
+            handler.msg = "No command given"
+            return
+        self.open_buffer(None)
+        buf = self.buffers[self.current]
+        buf.filename = f"[!{cmd}]"
+        buf.read_only = True
+        buf.lines = [f"$ {cmd}"]
+        try:
+            buf.shell = ShellCommand(cmd, self.renderer.cwd, self.loop)
+        except OSError as e:
+            buf.append_lines([str(e)])
+            return
+        self.input_handlers[self.current].msg = f"Running !{cmd}"
+
+    def poll_shells(self):
+        limit = self.config.get("shell_max_lines", 10000)
+        for buf, cur, handler in zip(self.buffers, self.cursors, self.input_handlers):
+            job = getattr(buf, "shell", None)
+            if job is None:
+                continue
+            lines = job.drain()
+            if job.done:
+                lines.append("[cancelled]" if job.cancelled else f"[exit {job.returncode}]")
+            if lines:
+                follow = cur.cy >= len(buf.lines) - 1
+                buf.append_lines(lines)
+                excess = len(buf.lines) - 1 - limit
+                if limit and excess > 0:
+                    buf.drop_lines(1, 1 + excess)
+                    cur.cy = max(0, cur.cy - excess)
+                if follow:
+                    cur.cy = len(buf.lines) - 1
+                    cur.cx = 0
+            if job.done:
+                handler.msg = f"!{job.cmd}: " + ("cancelled" if job.cancelled else f"exit {job.returncode}")
+                buf.shell = None
+
+    def cancel_jobs(self, idx):
+        cancelled = False
+        buf = self.buffers[idx]
+        for job in (getattr(buf, "shell", None), getattr(buf, "grep", None)):
+            if job is not None and not job.done:
+                job.cancel()
+                cancelled = True
+        return cancelled
+
+    def on_interrupt(self, signum, frame):
+        if self.cancel_jobs(self.current):
+            self.input_handlers[self.current].msg = "Cancelling..."
+        self.loop.wake()
+
+    def index_wait(self):
+        wait = -1
+        for buf in self.buffers:
+            if buf.search_index is None:
+                if not self.search_index_lines or len(buf.lines) < self.search_index_lines:
+                    continue
+                if buf.lines.indexing:
+                    wait = 100
+                    continue
+                buf.enable_search_index()
+            if not buf.search_index.done:
+                return 0
+        return wait
+
+    def index_step(self):
+        progress = any(buf.lines.indexing for buf in self.buffers)
+        for buf in self.buffers:
+            if buf.search_index is not None and not buf.search_index.done:
+                return buf.search_index.step() or progress
+        return progress
+
+    def wait_time(self):
+        waits = [w for w in (self.linter.timeout(), self.index_wait()) if w >= 0]
+        return min(waits) if waits else -1
 
     def save_session(self, name=None):
         if self.no_session:
@@ -91,11 +295,135 @@ class Tedit:
 
     def autosave(self):
         now = time.time()
+        saved = False
         if now - self.last_autosave > 10:
-            for b in self.buffers:
-                if b.filename and not getattr(b, 'read_only', False):
-                    b.save_file()
+            for b, h in zip(self.buffers, self.input_handlers):
+                if b.filename and not b.filename.startswith("[") and b.modified and not b.conflict:
+                    saved = True
+                    try:
+                        b.save_file()
+                    except OSError as e:
+                        h.msg = f"Autosave failed: {e.strerror or e}"
             self.last_autosave = now
+        return saved
+
+    def on_resize(self, signum, frame):
+        self.resized = True
+        self.loop.wake()
+
+    def handle_resize(self):
+        self.resized = False
+        size = os.get_terminal_size(sys.__stdout__.fileno())
+        curses.resizeterm(size.lines, size.columns)
+        self.renderer.writer.invalidate()
+
+    def pump(self, timeout=-1):
+        if not self.keys.pending():
+            waits = [w for w in (timeout, self.linter.timeout()) if w >= 0]
+            self.loop.run_once(min(waits) / 1000 if waits else None)
+        if self.resized:
+            self.handle_resize()
+        self.linter.poll()
+        self.poll_greps()
+        self.poll_shells()
+
+    def read_key(self, timeout=-1):
+        self.pump(timeout)
+        return self.keys.get(0)
+
+    def getch(self):
+        while True:
+            self.pump()
+            k = self.keys.getch(0)
+            if k != -1:
+                return k
+
+    def check_disk(self):
+        changed = False
+        for i, (buf, handler) in enumerate(zip(self.buffers, self.input_handlers)):
+            if not buf.filename or buf.filename.startswith("[") or buf.conflict:
+                continue
+            stamp = buf.disk_state()
+            if stamp == buf.disk_stamp:
+                continue
+            changed = True
+            if stamp is None:
+                buf.disk_stamp = None
+                handler.msg = f"{buf.filename} was removed from disk"
+            elif buf.modified:
+                buf.conflict = True
+                self.conflicts.append(buf)
+            else:
+                self.reload_buffer(i)
+        return changed
+
+    def reload_buffer(self, idx):
+        buf, cur, handler = self.buffers[idx], self.cursors[idx], self.input_handlers[idx]
+        try:
+            lmap = buf.reload()
+        except OSError as e:
+            handler.msg = f"Reload failed: {e.strerror or e}"
+            return
+        if lmap is not None:
+            cur.cy = lmap.line(cur.cy)[0]
+            marks = getattr(cur, 'marks', {})
+            for name, (y, x) in marks.items():
+                marks[name] = (lmap.line(y)[0], x)
+        cur.fix_cursor()
+        handler.msg = f"Reloaded {buf.filename} (changed on disk)"
+        handler.run_linter(0)
+
+    def resolve_conflicts(self):
+        while self.conflicts:
+            buf = self.conflicts.pop(0)
+            if buf not in self.buffers or not buf.conflict:
+                continue
+            idx = self.buffers.index(buf)
+            name = os.path.basename(buf.filename)
+            choice = self.renderer.prompt(f"{name} changed on disk: (r)eload or (k)eep your changes?", "rk")
+            if choice == "r":
+                self.reload_buffer(idx)
+            else:
+                buf.conflict = False
+                buf.disk_stamp = buf.disk_state()
+                self.input_handlers[idx].msg = f"Kept your changes to {name}; :w will overwrite the file"
+
+    def housekeeping(self):
+        changed = self.check_disk()
+        if self.config.check(force=True):
+            changed = True
+        if self.renderer.check_plugins():
+            changed = True
+        if self.renderer.sidebar and self.renderer.tree.check(force=True):
+            self.renderer.selected_file = min(self.renderer.selected_file, len(self.renderer.tree.rows) - 1)
+            changed = True
+        if self.autosave_enabled and self.autosave():
+            changed = True
+        if changed:
+            self.redraw = True
+
+    def draw_frame(self, buf, cur, handler):
+        if self.split_mode == 'vsplit' and self.split_buffers is not None:
+            try:
+                bufidx0, bufidx1 = self.split_buffers
+                if (0 <= bufidx0 < len(self.buffers)) and (0 <= bufidx1 < len(self.buffers)):
+                    bufs = [self.buffers[bufidx0], self.buffers[bufidx1]]
+                    curs = [self.cursors[bufidx0], self.cursors[bufidx1]]
+                    handlers = [self.input_handlers[bufidx0], self.input_handlers[bufidx1]]
+                    if hasattr(self.renderer, 'draw_split'):
+                        self.renderer.draw_split(bufs, curs, [h.mode for h in handlers], [h.msg for h in handlers], 'vsplit', self.split_focus, self.split_buffers, len(self.buffers))
+                else:
+                    self.split_mode = None
+                    self.split_buffers = None
+                    self.split_focus = 0
+                    self.renderer.draw(buf, cur, handler.mode, handler.msg, self.current, len(self.buffers))
+            except Exception:
+                self.split_mode = None
+                self.split_buffers = None
+                self.split_focus = 0
+                self.renderer.draw(buf, cur, handler.mode, handler.msg, self.current, len(self.buffers))
+        else:
+            self.renderer.draw(buf, cur, handler.mode, handler.msg, self.current, len(self.buffers))
 
     def run(self):
         cmd_mode = False
@@ -131,8 +459,12 @@ class Tedit:
                 cur = self.cursors[self.current]
                 handler = self.input_handlers[self.current]
             if cmd_mode:
+                self.redraw = True
                 self.renderer.draw_command(cmd_str)
-                k = self.stdscr.getch()
+                k = self.read_key()
+                if isinstance(k, str):
+                    cmd_str += k.split("\n", 1)[0]
+                    continue
                 if k in (10, 13):
                     result = self.handle_command_mode(cmd_str, handler)
                     if result == "quit":
@@ -159,40 +491,46 @@ class Tedit:
                 elif 32 <= k <= 126:
                     cmd_str += chr(k)
                 continue
-            if self.split_mode == 'vsplit' and self.split_buffers is not None:
-                try:
-                    bufidx0, bufidx1 = self.split_buffers
-                    if (0 <= bufidx0 < len(self.buffers)) and (0 <= bufidx1 < len(self.buffers)):
-                        bufs = [self.buffers[bufidx0], self.buffers[bufidx1]]
-                        curs = [self.cursors[bufidx0], self.cursors[bufidx1]]
-                        handlers = [self.input_handlers[bufidx0], self.input_handlers[bufidx1]]
-                        if hasattr(self.renderer, 'draw_split'):
-                            self.renderer.draw_split(bufs, curs, [h.mode for h in handlers], [h.msg for h in handlers], 'vsplit', self.split_focus, self.split_buffers, len(self.buffers))
-                        for h in handlers:
-                            h.msg = ""
-                    else:
-                        self.split_mode = None
-                        self.split_buffers = None
-                        self.split_focus = 0
-                        self.renderer.draw(buf, cur, handler.mode, handler.msg, self.current, len(self.buffers))
-                        handler.msg = ""
-                except Exception:
-                    self.split_mode = None
-                    self.split_buffers = None
-                    self.split_focus = 0
-                    self.renderer.draw(buf, cur, handler.mode, handler.msg, self.current, len(self.buffers))
-                    handler.msg = ""
-            else:
-                self.renderer.draw(buf, cur, handler.mode, handler.msg, self.current, len(self.buffers))
-                handler.msg = ""
-            k = self.stdscr.getch()
-            if self.autosave_enabled:
-                self.autosave()
+            if self.redraw and self.frames.ready(self.keys):
+                self.draw_frame(buf, cur, handler)
+                self.frames.done()
+                self.redraw = False
+            dispatched = self.loop.dispatched
+            if not self.keys.pending():
+                wait = self.wait_time()
+                self.loop.run_once(None if wait < 0 else wait / 1000)
+            if self.resized:
+                self.handle_resize()
+            k = self.keys.get(0)
+            if k != -1:
+                for h in self.input_handlers:
+                    h.msg = ""
+            if k != -1 or self.loop.dispatched != dispatched:
+                self.redraw = True
+            self.linter.poll()
+            self.poll_greps()
+            self.poll_shells()
+            if self.conflicts:
+                self.resolve_conflicts()
+            if k == -1:
+                if self.index_step():
+                    self.redraw = True
+                continue
+            if k == curses.KEY_RESIZE:
+                continue
             if self.split_mode and k == 9:
                 self.split_focus = 1 - self.split_focus
                 continue
+            if isinstance(k, str):
+                if handler.mode in ("INSERT", "NORMAL"):
+                    handler.insert_burst(k)
+                continue
             if handler.mode == "INSERT":
-                handler.handle_insert_mode(k)
+                text = chr(k) + self.keys.take_text() if k in TEXT_KEYS else ""
+                if len(text) > 1:
+                    handler.insert_burst(text)
+                else:
+                    handler.handle_insert_mode(k)
             elif handler.mode == "NORMAL":
                 if k == ord(":"):
                     cmd_mode = True
@@ -200,9 +538,7 @@ class Tedit:
                 else:
                     result = handler.handle_normal_mode(k)
                     if isinstance(result, str) and result.startswith(":e "):
-                        filename = result[3:].strip()
-                        self.open_buffer(filename)
-                        handler.msg = f"Opened {filename}"
+                        self.edit(result[3:])
                     elif isinstance(result, str) and result.startswith(":view "):
                         filename = result[6:].strip()
                         self.open_buffer(filename, read_only=True)
@@ -224,7 +560,7 @@ class Tedit:
                         self.load_session(name)
                         handler.msg = f"Session {name} loaded"
                     elif result == "exit_confirm":
-                        if self.renderer.confirm_exit():
+                        if not any(b.modified for b in self.buffers) or self.renderer.confirm_exit():
                             self.save_session()
                             break
                     elif result == ":switch_split":
@@ -232,13 +568,23 @@ class Tedit:
                             self.split_focus = 1 - self.split_focus
                         continue
             elif handler.mode == "VISUAL":
-                handler.handle_visual_mode(k)
+                result = handler.handle_visual_mode(k)
+                if result == ":'<,'>":
+                    cmd_mode = True
+                    cmd_str = "'<,'>"
 
     def handle_command_mode(self, cmd_str, handler):
         if cmd_str.startswith("e "):
-            filename = cmd_str[2:].strip()
-            self.open_buffer(filename)
-            handler.msg = f"Opened {filename}"
+            self.edit(cmd_str[2:])
+        elif cmd_str.startswith("!"):
+            self.shell(cmd_str[1:], handler)
+        elif cmd_str == "stop":
+            if not self.cancel_jobs(self.current):
+                handler.msg = "Nothing to stop"
+        elif cmd_str == "find" or cmd_str.startswith("find "):
+            self.find(cmd_str[5:], handler)
+        elif cmd_str.startswith("grep "):
+            self.grep(cmd_str[5:], handler)
         elif cmd_str.startswith("view "):
             filename = cmd_str[5:].strip()
             self.open_buffer(filename, read_only=True)
@@ -282,6 +628,7 @@ class Tedit:
 
     def close_buffer(self, idx):
         if len(self.buffers) > 1:
+            self.cancel_jobs(idx)
             del self.buffers[idx]
             del self.cursors[idx]
             del self.input_handlers[idx]
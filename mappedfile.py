@@ -0,0 +1,133 @@
+import mmap
+import os
+import threading
+from array import array
+from itertools import accumulate
+
+class MappedLines:
+    CHUNK = 1 << 20
+    TAIL = 4096
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, "rb")
+        self.size = self._file.seek(0, 2)
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.truncated = False
+        self.closed = False
+        self._offsets = array("q", [0])
+        self._scanned = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.done = self.size == 0
+        self._start()
+
+    def _start(self):
+        if not self.done and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._index_all, daemon=True)
+            self._thread.start()
+
+    def _read(self, start, stop):
+        if not self.truncated and os.fstat(self._file.fileno()).st_size < self.size:
+            self.truncated = True
+        if self.truncated:
+            return os.pread(self._file.fileno(), max(0, stop - start), start)
+        return self._map[start:stop]
+
+    def extend(self):
+        if self.closed or self.truncated:
+            return False
+        st = os.fstat(self._file.fileno())
+        try:
+            if st.st_size <= self.size or os.stat(self.path).st_ino != st.st_ino:
+                return False
+        except OSError:
+            return False
+        tail = max(0, self.size - self.TAIL)
+        if os.pread(self._file.fileno(), self.size - tail, tail) != self._map[tail:self.size]:
+            return False
+        new = mmap.mmap(self._file.fileno(), st.st_size, access=mmap.ACCESS_READ)
+        with self._lock:
+            old, self._map = self._map, new
+            self.size = st.st_size
+            self.done = False
+        if isinstance(old, mmap.mmap):
+            old.close()
+        self._start()
+        return True
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self.done = True
+            if isinstance(self._map, mmap.mmap):
+                self._map.close()
+            self._map = b""
+            self._file.close()
+
+    @property
+    def count(self):
+        if not self.done:
+            return len(self._offsets) - 1
+        n = len(self._offsets)
+        if self.size and self._offsets[-1] == self.size:
+            n -= 1
+        return max(n, 1)
+
+    def __len__(self):
+        return self.count
+
+    def _scan_chunk(self):
+        if self.done:
+            return
+        chunk = self._read(self._scanned, min(self.size, self._scanned + self.CHUNK))
+        parts = chunk.split(b"\n")
+        parts.pop()
+        if parts:
+            offsets = accumulate([len(p) + 1 for p in parts], initial=self._scanned)
+            next(offsets)
+            self._offsets.extend(offsets)
+        self._scanned += len(chunk)
+        if not chunk or self._scanned >= self.size:
+            self.done = True
+
+    def _index_all(self):
+        while not self.done:
+            with self._lock:
+                self._scan_chunk()
+
+    def ensure(self, n=None):
+        while not self.done and (n is None or self.count < n):
+            with self._lock:
+                self._scan_chunk()
+
+    def _decode(self, raw):
+        if raw.endswith(b"\r"):
+            raw = raw[:-1]
+        return raw.decode(self.encoding, "surrogateescape")
+
+    def _end(self, i):
+        if i + 1 < len(self._offsets):
+            return self._offsets[i + 1] - 1
+        return self.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            if i.stop is None or i.stop < 0:
+                self.ensure()
+            else:
+                self.ensure(i.stop)
+            start, stop, step = i.indices(self.count)
+            if step != 1 or stop <= start:
+                return [self[j] for j in range(start, stop, step)]
+            data = self._read(self._offsets[start], self._end(stop - 1))
+            lines = [self._decode(raw) for raw in data.split(b"\n")[:stop - start]]
+            return lines + [""] * (stop - start - len(lines))
+        if i < 0:
+            self.ensure()
+            i += self.count
+        self.ensure(i + 1)
+        if not 0 <= i < self.count:
+            raise IndexError("line index out of range")
+        return self._decode(self._read(self._offsets[i], self._end(i)))
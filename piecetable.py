@@ -0,0 +1,232 @@
+import random
+
+class _Piece:
+    __slots__ = ("source", "start", "count", "prio", "left", "right", "total")
+
+    def __init__(self, source, start, count, prio=None):
+        self.source = source
+        self.start = start
+        self.count = count
+        self.prio = random.random() if prio is None else prio
+        self.left = None
+        self.right = None
+        self.total = count
+
+def _total(node):
+    return node.total if node is not None else 0
+
+def _update(node):
+    node.total = _total(node.left) + node.count + _total(node.right)
+
+def _split(node, k):
+    if node is None:
+        return None, None
+    left_total = _total(node.left)
+    if k <= left_total:
+        left, right = _split(node.left, k)
+        node.left = right
+        _update(node)
+        return left, node
+    if k >= left_total + node.count:
+        left, right = _split(node.right, k - left_total - node.count)
+        node.right = left
+        _update(node)
+        return node, right
+    offset = k - left_total
+    tail = _Piece(node.source, node.start + offset, node.count - offset, node.prio)
+    tail.right = node.right
+    node.right = None
+    node.count = offset
+    _update(node)
+    _update(tail)
+    return node, tail
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.prio > right.prio:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+def _walk(node, skip):
+    if node is None:
+        return
+    left_total = _total(node.left)
+    if skip < left_total:
+        yield from _walk(node.left, skip)
+        yield node, 0
+        rest = 0
+    elif skip < left_total + node.count:
+        yield node, skip - left_total
+        rest = 0
+    else:
+        rest = skip - left_total - node.count
+    yield from _walk(node.right, rest)
+
+class PieceTable:
+    def __init__(self, lines=None):
+        self.reset(lines)
+
+    def reset(self, lines=None):
+        done = getattr(lines, "done", True)
+        if lines is None or (len(lines) == 0 and done):
+            lines = [""]
+        n = len(lines)
+        self._add = []
+        self._root = _Piece(lines, 0, n)
+        self._tail = None
+        self._absorbed = n
+        if not done:
+            self._tail = lines
+
+    def __len__(self):
+        if self._tail is not None:
+            return _total(self._root) + self._tail.count - self._absorbed
+        return _total(self._root)
+
+    @property
+    def indexing(self):
+        return self._tail is not None and not self._tail.done
+
+    def ensure(self, n=None):
+        if self._tail is not None:
+            self._tail.ensure(None if n is None else self._absorbed + n - _total(self._root))
+
+    def _absorb(self):
+        tail = self._tail
+        if tail is None:
+            return
+        count = tail.count
+        if count > self._absorbed:
+            self._root = _merge(self._root, _Piece(tail, self._absorbed, count - self._absorbed))
+            self._absorbed = count
+        if tail.done:
+            self._tail = None
+
+    def __bool__(self):
+        return True
+
+    def _find(self, i):
+        node = self._root
+        while node is not None:
+            left_total = _total(node.left)
+            if i < left_total:
+                node = node.left
+            elif i < left_total + node.count:
+                return node, i - left_total
+            else:
+                i -= left_total + node.count
+                node = node.right
+        raise IndexError("line index out of range")
+
+    def _index(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("line index out of range")
+        return i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return list(self.iter_range(0, len(self)))[i]
+            return list(self.iter_range(start, stop))
+        i = self._index(i)
+        root_total = _total(self._root)
+        if i >= root_total:
+            return self._tail[self._absorbed + i - root_total]
+        node, offset = self._find(i)
+        return node.source[node.start + offset]
+
+    def __setitem__(self, i, line):
+        i = self._index(i)
+        self._absorb()
+        node, offset = self._find(i)
+        if node.source is self._add:
+            self._add[node.start + offset] = line
+            return
+        left, rest = _split(self._root, i)
+        _, right = _split(rest, 1)
+        self._add.append(line)
+        self._root = _merge(_merge(left, _Piece(self._add, len(self._add) - 1, 1)), right)
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                raise ValueError("extended slices are not supported")
+            self.delete(start, stop)
+        else:
+            i = self._index(i)
+            self.delete(i, i + 1)
+
+    def __iter__(self):
+        self.ensure()
+        return self.iter_range(0, len(self))
+
+    def iter_range(self, start, stop):
+        root_total = _total(self._root)
+        remaining = min(stop, root_total) - start
+        if remaining > 0:
+            for node, offset in _walk(self._root, start):
+                take = min(node.count - offset, remaining)
+                first = node.start + offset
+                yield from node.source[first:first + take]
+                remaining -= take
+                if remaining <= 0:
+                    break
+        if stop > root_total and self._tail is not None:
+            first = self._absorbed + max(start, root_total) - root_total
+            last = self._absorbed + stop - root_total
+            for chunk in range(first, last, 4096):
+                yield from self._tail[chunk:min(chunk + 4096, last)]
+
+    def insert(self, i, line):
+        self.insert_lines(i, [line])
+
+    def append(self, line):
+        self.insert_lines(len(self), [line])
+
+    def insert_lines(self, i, lines):
+        if not lines:
+            return
+        n = len(self)
+        if i < 0:
+            i = max(0, i + n)
+        i = min(i, n)
+        self._absorb()
+        start = len(self._add)
+        self._add.extend(lines)
+        left, right = _split(self._root, i)
+        self._root = _merge(_merge(left, _Piece(self._add, start, len(lines))), right)
+
+    def delete(self, start, stop):
+        if stop <= start:
+            return
+        self._absorb()
+        left, rest = _split(self._root, start)
+        _, right = _split(rest, stop - start)
+        self._root = _merge(left, right)
+        if self._root is None:
+            self.reset()
+
+    def compact(self):
+        if self._tail is not None or len(self._add) <= 2 * len(self) + 1024:
+            return False
+        self._add = list(self.iter_range(0, len(self)))
+        self._root = _Piece(self._add, 0, len(self._add))
+        return True
+
+    def pop(self, i=-1):
+        i = self._index(i)
+        line = self[i]
+        self.delete(i, i + 1)
+        return line
@@ -0,0 +1,93 @@
+import importlib.util
+import os
+import time
+
+class Plugin:
+    def __init__(self, ext, path):
+        self.ext = ext
+        self.path = path
+        self.module = None
+        self.stamp = None
+        self.error = None
+
+class PluginManager:
+    def __init__(self, directory, interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self.plugins = {}
+        self.dir_stamp = None
+        self.last_check = time.monotonic()
+        self.scan()
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def scan(self):
+        self.dir_stamp = self._stat(self.directory)
+        found = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".py") and entry.is_file():
+                        ext = entry.name[:-3]
+                        plugin = self.plugins.get(ext)
+                        found[ext] = plugin if plugin is not None else Plugin(ext, entry.path)
+        except OSError:
+            pass
+        self.plugins = found
+
+    def _load(self, plugin):
+        plugin.stamp = self._stat(plugin.path)
+        plugin.module = None
+        plugin.error = None
+        try:
+            spec = importlib.util.spec_from_file_location(f"tedit_{plugin.ext}", plugin.path)
+            if spec is None or spec.loader is None:
+                raise ImportError(f"cannot load {plugin.path}")
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            plugin.module = module
+        except Exception as e:
+            plugin.error = f"{type(e).__name__}: {e}"
+
+    def get(self, ext, name):
+        plugin = self.plugins.get(ext)
+        if plugin is None:
+            return None
+        if plugin.stamp is None:
+            self._load(plugin)
+        return getattr(plugin.module, name, None)
+
+    def check(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_check < self.interval:
+            return False
+        self.last_check = now
+        changed = False
+        if self._stat(self.directory) != self.dir_stamp:
+            self.scan()
+            changed = True
+        for plugin in self.plugins.values():
+            if plugin.stamp is not None and self._stat(plugin.path) != plugin.stamp:
+                plugin.stamp = None
+                plugin.module = None
+                plugin.error = None
+                changed = True
+        return changed
+
+    def errors(self):
+        return {ext: p.error for ext, p in self.plugins.items() if p.error}
+
+    def status(self):
+        loaded = sorted(ext for ext, p in self.plugins.items() if p.module is not None)
+        failed = sorted(self.errors())
+        idle = len(self.plugins) - len(loaded) - len(failed)
+        parts = [f"{len(loaded)} loaded"]
+        if failed:
+            parts.append("failed: " + ", ".join(failed))
+        parts.append(f"{idle} not imported")
+        return ", ".join(parts)
@@ -1,24 +1,42 @@
 import curses
 import os
 import re
-import importlib.util
-import glob
+from config import Config
+from filetree import FileTree
+from frame import Frame, FrameWriter
+from highlight import HighlightCache, Tokenizer, load_languages
+from plugins import PluginManager
 
 class Renderer:
-    def __init__(self, stdscr):
+    MARKUP = re.compile('([\x01\x02\x03\x04])')
+
+    def __init__(self, stdscr, config=None):
         self.stdscr = stdscr
+        self.getch = None
         self.theme = "dark"
         self.wrap = False
+        self.writer = FrameWriter(stdscr)
+        self.frame = None
         self.setup_colors()
         self.sidebar = False
-        self.files = []
+        self.tree = FileTree(os.getcwd())
         self.selected_file = 0
         self.sidebar_scroll = 0
-        self.cwd = os.getcwd()
-        self.refresh_files()
         self.show_line_numbers = True
-        self.external_highlighters = {}
-        self.external_linters = {}
+        self.highlight_cache = HighlightCache()
+        self.search_pattern = None
+        self.hlsearch = True
+        self.match_cache = HighlightCache(4096)
+        self.language_errors = {}
+        self.languages = load_languages([
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'languages'),
+            os.path.expanduser('~/.config/tedit/languages'),
+        ], self.language_errors)
+        self.plugins = PluginManager(os.path.expanduser("~/.config/tedit"))
+        self.config = config if config is not None else Config()
+        self.config.subscribe(self.configure)
+
+    def configure(self, config):
         self.diagnostic_symbols = {
             'error': 'E',
             'warning': 'W',
@@ -31,35 +49,22 @@ class Renderer:
             'info': 8,
             'todo': 9,
         }
-        config_dir = os.path.expanduser("~/.config/tedit")
-        if os.path.isdir(config_dir):
-            for path in glob.glob(os.path.join(config_dir, "*.py")):
-                ext = os.path.splitext(os.path.basename(path))[0]
-                spec = importlib.util.spec_from_file_location(f"tedit_{ext}", path)
-                if spec is not None and spec.loader is not None:
-                    mod = importlib.util.module_from_spec(spec)
-                    try:
-                        spec.loader.exec_module(mod)
-                        if hasattr(mod, "highlight_line"):
-                            self.external_highlighters[ext] = mod.highlight_line
-                        if hasattr(mod, "lint_buffer"):
-                            self.external_linters[ext] = mod.lint_buffer
-                    except Exception:
-                        pass
-        config_path = os.path.expanduser("~/.config/tedit.json")
-        if os.path.exists(config_path):
-            try:
-                import json
-                with open(config_path) as f:
-                    cfg = json.load(f)
-                self.diagnostic_symbols.update(cfg.get("diagnostic_symbols", {}))
-                self.diagnostic_colors.update(cfg.get("diagnostic_colors", {}))
-            except Exception:
-                pass
+        self.diagnostic_symbols.update(config.get("diagnostic_symbols", {}))
+        self.diagnostic_colors.update(config.get("diagnostic_colors", {}))
+        self.writer.invalidate()
 
     def set_theme(self, theme):
         self.theme = theme
         self.setup_colors()
+        self.highlight_cache.clear()
+        self.writer.invalidate()
+
+    def check_plugins(self):
+        if not self.plugins.check(force=True):
+            return False
+        self.highlight_cache.clear()
+        self.writer.invalidate()
+        return True
 
 
     def setup_colors(self):
@@ -85,29 +90,23 @@ class Renderer:
             curses.init_pair(7, curses.COLOR_YELLOW, curses.COLOR_BLACK)
             curses.init_pair(8, curses.COLOR_CYAN, curses.COLOR_BLACK)
             curses.init_pair(9, curses.COLOR_GREEN, curses.COLOR_BLACK)
+        self.stdscr.bkgd(' ', curses.color_pair(1))
 
     def toggle_wrap(self):
         self.wrap = not self.wrap
 
+    @property
+    def cwd(self):
+        return self.tree.root
+
     def refresh_files(self):
-        entries = os.listdir(self.cwd)
-        folders = [f for f in entries if os.path.isdir(os.path.join(self.cwd, f))]
-        files = [f for f in entries if os.path.isfile(os.path.join(self.cwd, f))]
-        folders.sort()
-        files.sort()
-        folders = [f + '/' for f in folders]
-        self.files = folders + files
-        if os.path.abspath(self.cwd) != os.path.abspath(os.sep):
-            self.files = ['..'] + self.files
+        if self.tree.check(force=True):
+            self.selected_file = min(self.selected_file, len(self.tree.rows) - 1)
 
     def change_directory(self, new_dir):
-        if new_dir == '..':
-            parent = os.path.dirname(self.cwd)
-            self.cwd = parent
-        else:
-            self.cwd = os.path.join(self.cwd, new_dir)
+        self.tree.set_root(os.path.join(self.cwd, new_dir))
         self.selected_file = 0
-        self.refresh_files()
+        self.sidebar_scroll = 0
 
     def toggle_sidebar(self):
         self.sidebar = not self.sidebar
@@ -127,28 +126,101 @@ class Renderer:
             dtype, _ = diagnostics[0]
             color_code = self.diagnostic_colors.get(dtype, 1)
             return f'\x05{color_code}\x06' + line + '\x02'
-        if ext and ext in self.external_highlighters:
+        highlighter = self.plugins.get(ext, "highlight_line") if ext else None
+        return self._highlight_cached(line, filetype, ext, highlighter, None)
+
+    def highlight_row(self, buffer, i):
+        filetype = buffer.filename or ''
+        ext = os.path.splitext(filetype)[-1].lstrip('.') if filetype else None
+        highlighter = self.plugins.get(ext, "highlight_line") if ext else None
+        state = None
+        if highlighter is None and ext in self.languages:
+            state = self._tokenizer(buffer, self.languages[ext]).state_before(buffer.lines, i)
+        return self._highlight_cached(buffer.lines[i], filetype, ext, highlighter, state)
+
+    def _tokenizer(self, buffer, lexer):
+        tokenizer = buffer.tokenizer
+        if tokenizer is None or tokenizer.lexer is not lexer:
+            if tokenizer is not None:
+                buffer.listeners.remove(tokenizer.changed)
+            tokenizer = buffer.tokenizer = Tokenizer(lexer)
+            buffer.listeners.append(tokenizer.changed)
+        return tokenizer
+
+    def _highlight_cached(self, line, filetype, ext, highlighter, state):
+        key = (line, ext, highlighter, state)
+        hline = self.highlight_cache.get(key)
+        if hline is None:
+            hline = self._highlight(line, filetype, ext, highlighter, state)
+            self.highlight_cache.put(key, hline)
+        return hline
+
+    def _highlight(self, line, filetype, ext, highlighter, state):
+        if highlighter is not None:
             try:
-                return self.external_highlighters[ext](line, filetype)
+                return highlighter(line, filetype)
             except Exception:
                 pass
-        if filetype and filetype.endswith('.py'):
-            keywords = r'\b(def|class|import|from|as|if|elif|else|for|while|try|except|with|return|yield|in|is|not|and|or|pass|break|continue|lambda|True|False|None)\b'
-            line = re.sub(keywords, lambda m: f'\x01{m.group(0)}\x02', line)
-            line = re.sub(r'#[^\n]*', lambda m: f'\x03{m.group(0)}\x02', line)
-            line = re.sub(r'("[^"]*"|\'[^\"]*\')', lambda m: f'\x04{m.group(0)}\x02', line)
-        elif filetype and (filetype.endswith('.md') or filetype.endswith('.markdown')):
-            line = re.sub(r'^(#+)(.*)', lambda m: f'\x01{m.group(1)}{m.group(2)}\x02', line)
-            line = re.sub(r'\*\*([^*]+)\*\*', lambda m: f'\x04{m.group(0)}\x02', line)
+        if ext in self.languages:
+            return self.languages[ext].highlight(line, state)
         return line
 
+    def _runs(self, hline):
+        colors = {'\x01': 2, '\x02': 1, '\x03': 4, '\x04': 3}
+        text = []
+        runs = []
+        pos = 0
+        color = curses.color_pair(1)
+        for part in self.MARKUP.split(hline):
+            if part in colors:
+                color = curses.color_pair(colors[part])
+            elif part:
+                text.append(part)
+                runs.append((pos, pos + len(part), color))
+                pos += len(part)
+        return ''.join(text), runs
+
+    def _search_spans(self, text):
+        key = (self.search_pattern.key, text)
+        spans = self.match_cache.get(key)
+        if spans is None:
+            spans = self.search_pattern.spans(text)
+            self.match_cache.put(key, spans)
+        return spans
+
+    def _overlay(self, runs, start, end, attr):
+        if start >= end:
+            return runs
+        out = []
+        for s, e, a in runs:
+            if e <= start or s >= end:
+                out.append((s, e, a))
+                continue
+            if s < start:
+                out.append((s, start, a))
+            out.append((max(s, start), min(e, end), attr))
+            if e > end:
+                out.append((end, e, a))
+        return out
+
+    def _paint_runs(self, row, col, text, runs, lo, hi):
+        pending = None
+        for s, e, a in runs:
+            s, e = max(s, lo), min(e, hi)
+            if s >= e:
+                continue
+            if pending and pending[1] == s and pending[2] == a:
+                pending[1] = e
+                continue
+            if pending:
+                self.frame.put(row, col + pending[0] - lo, text[pending[0]:pending[1]], pending[2])
+            pending = [s, e, a]
+        if pending:
+            self.frame.put(row, col + pending[0] - lo, text[pending[0]:pending[1]], pending[2])
+
     def draw(self, buffer, cursor, mode, msg, buf_idx=0, buf_count=1):
-        if self.theme == "light":
-            self.stdscr.bkgd(' ', curses.color_pair(1))
-        else:
-            self.stdscr.bkgd(' ', curses.color_pair(1))
-        self.stdscr.clear()
         maxy, maxx = self.stdscr.getmaxyx()
+        self.frame = Frame(maxy, maxx)
         height, width = maxy - 1, maxx
         sidebar_width = 20 if self.sidebar else 0
         num_width = 5 if self.show_line_numbers else 0
@@ -164,28 +236,31 @@ class Renderer:
             draw_sidebar=self.sidebar, draw_minimap=True, draw_status=True, draw_cursor=True,
             visual_range=visual_range
         )
-        self.stdscr.refresh()
+        if not self.wrap:
+            self.frame.scroll = (0, height - 1, cursor.scroll)
+        self.writer.flush(self.frame)
 
     def _draw_buffer(self, buffer, cursor, mode, msg, buf_idx, buf_count, sidebar_width, num_width, minimap_width, y_offset, text_width, height, split=False, focused=False, draw_sidebar=False, draw_minimap=False, draw_status=False, draw_cursor=False, visual_range=None):
         maxy, maxx = self.stdscr.getmaxyx()
         width = maxx
         if draw_sidebar:
-            total_files = len(self.files)
+            rows = self.tree.rows
+            total_files = len(rows)
             max_visible = height
             if self.selected_file < self.sidebar_scroll:
                 self.sidebar_scroll = self.selected_file
             elif self.selected_file >= self.sidebar_scroll + max_visible:
                 self.sidebar_scroll = self.selected_file - max_visible + 1
             self.sidebar_scroll = max(0, min(self.sidebar_scroll, max(0, total_files - max_visible)))
-            visible_files = self.files[self.sidebar_scroll:self.sidebar_scroll+max_visible]
-            for i, fname in enumerate(visible_files):
+            for i, row in enumerate(rows[self.sidebar_scroll:self.sidebar_scroll+max_visible]):
                 idx = i + self.sidebar_scroll
+                fname = self.tree.label(row)
                 attr = curses.color_pair(2) if idx != self.selected_file else curses.color_pair(5)
-                if fname.endswith('/') or fname == '..':
+                if row.is_dir:
                     attr = curses.color_pair(4) if idx != self.selected_file else curses.color_pair(5)
-                self.stdscr.addstr(i + y_offset, 0, fname[:sidebar_width-1].ljust(sidebar_width-1), attr)
+                self.frame.put(i + y_offset, 0, fname[:sidebar_width-1].ljust(sidebar_width-1), attr)
             for i in range(height):
-                self.stdscr.addstr(i + y_offset, sidebar_width-1, '|', curses.color_pair(3))
+                self.frame.put(i + y_offset, sidebar_width-1, '|', curses.color_pair(3))
         cursor.fix_cursor()
         if cursor.cy < cursor.scroll:
             cursor.scroll = cursor.cy
@@ -194,13 +269,9 @@ class Renderer:
         for i in range(cursor.scroll, cursor.scroll + height):
             if i >= len(buffer.lines):
                 break
-            line = buffer.lines[i]
-            filetype = buffer.filename or ''
             diag = buffer.diagnostics.get(i, [])
-            hline = self.highlight_line(line, filetype)
-            idx = 0
+            hline = self.highlight_row(buffer, i)
             col = sidebar_width + (num_width if self.show_line_numbers else 0)
-            color = curses.color_pair(1)
             diagnostic_bg = None
             if diag:
                 priority = {'error': 0, 'warning': 1, 'todo': 2, 'info': 3}
@@ -218,95 +289,30 @@ class Renderer:
             if self.show_line_numbers:
                 num = f"{i+1:4} "
                 attr = curses.color_pair(5) if i == cursor.cy else curses.color_pair(1)
-                self.stdscr.addstr(i - cursor.scroll + y_offset, sidebar_width, num, attr)
+                self.frame.put(i - cursor.scroll + y_offset, sidebar_width, num, attr)
                 if diag_symbol:
-                    self.stdscr.addstr(i - cursor.scroll + y_offset, sidebar_width + len(num), diag_symbol, diag_color)
+                    self.frame.put(i - cursor.scroll + y_offset, sidebar_width + len(num), diag_symbol, diag_color)
+            text, runs = self._runs(hline)
+            if diagnostic_bg:
+                runs = [(start, end, curses.color_pair(attr & 0x0F) | curses.A_REVERSE if diagnostic_bg != 1 else attr) for start, end, attr in runs]
+            if self.hlsearch and self.search_pattern is not None:
+                for start, end in self._search_spans(text):
+                    runs = self._overlay(runs, start, end, curses.color_pair(7) | curses.A_REVERSE)
+            if visual_range is not None:
+                vis_y1, vis_x1, vis_y2, vis_x2 = visual_range
+                if vis_y1 <= i <= vis_y2:
+                    start = vis_x1 if i == vis_y1 else 0
+                    end = vis_x2 + 1 if i == vis_y2 else len(text)
+                    runs = self._overlay(runs, start, end, curses.color_pair(5))
+            row = i - cursor.scroll + y_offset
             if self.wrap:
-                wrap_col = col
-                line_buffer = []
-                color = curses.color_pair(1)
-                curr_col = 0
-                idx = 0
-                hlen = len(hline)
-                while idx < hlen:
-                    ch = hline[idx]
-                    if ch == '\x01':
-                        color = curses.color_pair(2)
-                        idx += 1
-                        continue
-                    elif ch == '\x03':
-                        color = curses.color_pair(4)
-                        idx += 1
-                        continue
-                    elif ch == '\x04':
-                        color = curses.color_pair(3)
-                        idx += 1
-                        continue
-                    elif ch == '\x02':
-                        color = curses.color_pair(1)
-                        idx += 1
-                        continue
-                    else:
-                        if diagnostic_bg:
-                            fg = color & 0x0F
-                            bg = diagnostic_bg
-                            combined = curses.color_pair(fg) | curses.A_REVERSE if bg != 1 else color
-                            line_buffer.append((ch, combined))
-                        else:
-                            line_buffer.append((ch, color))
-                        idx += 1
                 max_text_width = text_width - num_width
-                row = i - cursor.scroll + y_offset
-                col_offset = wrap_col
-                curr = 0
-                while curr < len(line_buffer):
-                    chunk = line_buffer[curr:curr+max_text_width]
-                    for j, (wch, wcolor) in enumerate(chunk):
-                        try:
-                            self.stdscr.addstr(row, col_offset + j, wch, wcolor)
-                        except curses.error:
-                            pass
-                    curr += max_text_width
-                    row += 1
-                    if row - (i - cursor.scroll + y_offset) >= height:
-                        break
+                if max_text_width > 0:
+                    for chunk in range(min(height, -(-len(text) // max_text_width))):
+                        lo = chunk * max_text_width
+                        self._paint_runs(row + chunk, col, text, runs, lo, lo + max_text_width)
             else:
-                vis_y1 = vis_x1 = vis_y2 = vis_x2 = None
-                if visual_range is not None:
-                    vis_y1, vis_x1, vis_y2, vis_x2 = visual_range
-                line_start = cursor.scroll_x
-                line_end = cursor.scroll_x + text_width - 1
-                idx = line_start
-                col_offset = col
-                while idx < len(hline) and idx <= line_end:
-                    ch = hline[idx]
-                    highlight = False
-                    if (vis_y1 is not None and vis_x1 is not None and vis_y2 is not None and vis_x2 is not None):
-                        if vis_y1 == vis_y2:
-                            if i == vis_y1 and vis_x1 <= idx <= vis_x2:
-                                highlight = True
-                        else:
-                            if (i == vis_y1 and idx >= vis_x1) or (i == vis_y2 and idx <= vis_x2) or (vis_y1 < i < vis_y2):
-                                highlight = True
-                    if ch == '\x01':
-                        color = curses.color_pair(2)
-                    elif ch == '\x03':
-                        color = curses.color_pair(4)
-                    elif ch == '\x04':
-                        color = curses.color_pair(3)
-                    elif ch == '\x02':
-                        color = curses.color_pair(1)
-                    else:
-                        if diagnostic_bg:
-                            fg = color & 0x0F
-                            bg = diagnostic_bg
-                            combined = curses.color_pair(fg) | curses.A_REVERSE if bg != 1 else color
-                            draw_color = curses.color_pair(5) if highlight else combined
-                        else:
-                            draw_color = curses.color_pair(5) if highlight else color
-                        self.stdscr.addstr(i - cursor.scroll + y_offset, col_offset, ch, draw_color)
-                        col_offset += 1
-                    idx += 1
+                self._paint_runs(row, col, text, runs, cursor.scroll_x, cursor.scroll_x + text_width)
             if i == cursor.cy:
                 if cursor.cx < cursor.scroll_x:
                     cursor.scroll_x = cursor.cx
@@ -319,27 +325,25 @@ class Renderer:
                 line_idx = int(y * total_lines / height) if total_lines > 0 else 0
                 if 0 <= line_idx < total_lines:
                     ch = '|' if cursor.scroll <= line_idx < cursor.scroll + height else '.'
-                    self.stdscr.addstr(y + y_offset, minmap_x, ch, curses.color_pair(2 if ch == '|' else 1))
-        modified = "*" if buffer.undo_stack else " "
+                    self.frame.put(y + y_offset, minmap_x, ch, curses.color_pair(2 if ch == '|' else 1))
+        modified = "*" if buffer.modified else " "
         if draw_status:
             diag_msgs = buffer.diagnostics.get(cursor.cy, [])
             diag_text = ''
             if diag_msgs:
                 diag_text = '; '.join(m for _, m in diag_msgs)
             status = f" {mode} | {modified}{buffer.filename or '[No Name]'} | Ln {cursor.cy + 1}, Col {cursor.cx + 1} | Buf {buf_idx+1}/{buf_count} {msg}"
+            if buffer.lines.indexing:
+                status += f" | indexing {len(buffer.lines)} lines"
             if diag_text:
                 status += f" | {diag_text}"
-            self.stdscr.addstr(maxy - 1, 0, status[:maxx - 1], curses.color_pair(3))
+            self.frame.put(maxy - 1, 0, status[:maxx - 1], curses.color_pair(3))
         if draw_cursor and focused:
-            self.stdscr.move(cursor.cy - cursor.scroll + y_offset, sidebar_width + (num_width if self.show_line_numbers else 0) + (cursor.cx - cursor.scroll_x))
+            self.frame.cursor = (cursor.cy - cursor.scroll + y_offset, sidebar_width + (num_width if self.show_line_numbers else 0) + (cursor.cx - cursor.scroll_x))
 
     def draw_split(self, buffers, cursors, modes, msgs, split_mode, split_focus, split_buffers, buf_count):
-        if self.theme == "light":
-            self.stdscr.bkgd(' ', curses.color_pair(1))
-        else:
-            self.stdscr.bkgd(' ', curses.color_pair(1))
-        self.stdscr.clear()
         maxy, maxx = self.stdscr.getmaxyx()
+        self.frame = Frame(maxy, maxx)
         sidebar_width = 20 if self.sidebar else 0
         num_width = 5 if self.show_line_numbers else 0
         minimap_width = 8
@@ -362,8 +366,8 @@ class Renderer:
                 draw_sidebar=False, draw_minimap=True, draw_status=True, draw_cursor=(split_focus==1)
             )
             for y in range(height):
-                self.stdscr.addch(y, sidebar_width + text_width1, curses.ACS_VLINE, curses.color_pair(3))
-        self.stdscr.refresh()
+                self.frame.put(y, sidebar_width + text_width1, curses.ACS_VLINE, curses.color_pair(3))
+        self.writer.flush(self.frame)
 
     def draw_command(self, cmd_str):
         maxy, maxx = self.stdscr.getmaxyx()
@@ -375,32 +379,88 @@ class Renderer:
                 pass
         self.stdscr.move(maxy - 1, len(cmd_str) + 1)
         self.stdscr.refresh()
+        self.writer.invalidate(maxy - 1)
+
+    def draw_picker(self, query, results, selected, status):
+        maxy, maxx = self.stdscr.getmaxyx()
+        rows = max(0, maxy - 1)
+        for i in range(rows):
+            y = maxy - 2 - i
+            if i < len(results):
+                attr = curses.color_pair(5) if i == selected else curses.color_pair(2)
+                text = (" > " if i == selected else "   ") + results[i]
+            else:
+                attr = curses.color_pair(1)
+                text = ""
+            try:
+                self.stdscr.addstr(y, 0, text[:maxx - 1].ljust(maxx - 1), attr)
+            except curses.error:
+                pass
+            self.writer.invalidate(y)
+        prompt = "find: " + query
+        line = prompt + status.rjust(max(0, maxx - 1 - len(prompt)))
+        try:
+            self.stdscr.addstr(maxy - 1, 0, line[:maxx - 1], curses.color_pair(3))
+        except curses.error:
+            pass
+        self.stdscr.move(maxy - 1, min(len(prompt), maxx - 1))
+        self.stdscr.refresh()
+        self.writer.invalidate(maxy - 1)
 
     def confirm_exit(self):
+        return self.prompt("Exit without saving? (y/n)", "yn") == "y"
+
+    def prompt(self, message, choices):
         maxy, maxx = self.stdscr.getmaxyx()
-        height, width = 3, 30
+        height, width = 3, min(maxx, len(message) + 4)
         starty = (maxy - height) // 2
         startx = (maxx - width) // 2
         win = curses.newwin(height, width, starty, startx)
         win.bkgd(' ', curses.color_pair(3))
         win.box()
-        win.addstr(1, 2, "Exit without saving? (y/n)")
+        win.addstr(1, 2, message[:width - 4])
         win.refresh()
+        self.writer.invalidate()
         while True:
-            c = win.getch()
-            if c in (ord('y'), ord('Y')):
-                return True
-            elif c in (ord('n'), ord('N')):
-                return False
-
-    def get_input(self, prompt):
-        maxy, maxx = self.stdscr.getmaxyx()
-        curses.echo()
-        self.stdscr.addstr(maxy - 1, 0, prompt)
-        s = self.stdscr.getstr(maxy - 1, len(prompt), 100).decode("utf-8")
-        curses.noecho()
+            c = self.getch() if self.getch else win.getch()
+            if isinstance(c, int) and 0 <= c < 256 and chr(c).lower() in choices:
+                return chr(c).lower()
 
-        return s
+    def get_input(self, prompt, limit=100):
+        text = ""
+        pending = bytearray()
+        while True:
+            maxy, maxx = self.stdscr.getmaxyx()
+            line = prompt + text
+            self.stdscr.move(maxy - 1, 0)
+            self.stdscr.clrtoeol()
+            try:
+                self.stdscr.addstr(maxy - 1, 0, line[max(0, len(line) - maxx + 1):])
+            except curses.error:
+                pass
+            self.stdscr.refresh()
+            c = self.getch() if self.getch else self.stdscr.getch()
+            if isinstance(c, str):
+                text = (text + c.split("\n", 1)[0])[:limit]
+            elif c in (10, 13):
+                break
+            elif c == 27:
+                text = ""
+                break
+            elif c in (8, 127, curses.KEY_BACKSPACE):
+                text = text[:-1]
+            elif 32 <= c <= 126 and len(text) < limit:
+                text += chr(c)
+            elif 128 <= c < 256 and len(text) < limit:
+                pending.append(c)
+                try:
+                    text += pending.decode("utf-8")
+                    pending.clear()
+                except UnicodeDecodeError:
+                    if len(pending) >= 4:
+                        pending.clear()
+        self.writer.invalidate(maxy - 1)
+        return text
 
     def get_external_linter(self, ext):
-        return self.external_linters.get(ext)
\ No newline at end of file
+        return self.plugins.get(ext, "lint_buffer") if ext else None
\ No newline at end of file
@@ -0,0 +1,67 @@
+import re
+
+REGEX_CHARS = re.compile(r"[\\.^$*+?{}\[\]|()]")
+
+class SearchPattern:
+    def __init__(self, text, regex=True, ignore_case=False):
+        self.text = text
+        source = text
+        if regex and "\\c" in source:
+            source = source.replace("\\c", "")
+            ignore_case = True
+        if not regex:
+            self.literal = source
+            source = re.escape(source)
+        else:
+            self.literal = None if REGEX_CHARS.search(source) else source
+        flags = re.IGNORECASE if ignore_case else 0
+        if ignore_case:
+            self.literal = None
+        self.regex = re.compile(source, flags)
+        self.key = (source, flags)
+
+    def __str__(self):
+        return self.text
+
+    def _matches(self, line, pos=0):
+        for m in self.regex.finditer(line, pos):
+            if m.end() > m.start():
+                yield m
+
+    def find(self, line, start=0):
+        if self.literal is not None:
+            return line.find(self.literal, start) if self.literal else -1
+        for m in self._matches(line, start):
+            return m.start()
+        return -1
+
+    def rfind(self, line, before=None):
+        if self.literal is not None:
+            if not self.literal:
+                return -1
+            if before is None:
+                return line.rfind(self.literal)
+            return line.rfind(self.literal, 0, max(0, before + len(self.literal) - 1))
+        x = -1
+        for m in self._matches(line):
+            if before is not None and m.start() >= before:
+                break
+            x = m.start()
+        return x
+
+    def count(self, line, before=None):
+        if self.literal is not None:
+            if not self.literal:
+                return 0
+            if before is None:
+                return line.count(self.literal)
+            return line.count(self.literal, 0, max(0, before + len(self.literal) - 1))
+        n = 0
+        for m in self._matches(line):
+            if before is not None and m.start() >= before:
+                break
+            n += 1
+        return n
+
+    def spans(self, line):
+        return [(m.start(), m.end()) for m in self._matches(line)]
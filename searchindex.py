@@ -0,0 +1,83 @@
+import time
+
+class SearchIndex:
+    BLOCK = 256
+    BITS = 1 << 15
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.counts = []
+        self.masks = []
+        self.pending = 0
+        self._reset(len(lines))
+
+    def _reset(self, n):
+        self.counts = [min(self.BLOCK, n - i) for i in range(0, n, self.BLOCK)] or [0]
+        self.masks = [None] * len(self.counts)
+        self.pending = 0
+
+    @property
+    def done(self):
+        return self.pending >= len(self.counts)
+
+    def _mask(self, grams):
+        bits = bytearray(self.BITS // 8)
+        for g in grams:
+            h = hash(g) & (self.BITS - 1)
+            bits[h >> 3] |= 1 << (h & 7)
+        return int.from_bytes(bits, "little")
+
+    def _grams(self, text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _locate(self, line):
+        first = 0
+        for b, count in enumerate(self.counts):
+            if line < first + count:
+                return b, first
+            first += count
+        return len(self.counts) - 1, first - self.counts[-1]
+
+    def changed(self, start, old, new):
+        b, first = self._locate(start)
+        end = start + max(old, 1)
+        e, pos = b, first
+        while e < len(self.counts) and pos < end:
+            pos += self.counts[e]
+            e += 1
+        total = sum(self.counts[b:e]) + new - old
+        parts = max(1, total // self.BLOCK)
+        chunks = [total // parts + (i < total % parts) for i in range(parts)]
+        if total == 0 and len(self.counts) > e - b:
+            chunks = []
+        self.counts[b:e] = chunks
+        self.masks[b:e] = [None] * len(chunks)
+        self.pending = min(self.pending, b)
+
+    def step(self, budget=0.01):
+        deadline = time.monotonic() + budget
+        first = sum(self.counts[:self.pending])
+        while self.pending < len(self.counts):
+            b = self.pending
+            count = self.counts[b]
+            if self.masks[b] is None:
+                text = "\n".join(self.lines.iter_range(first, first + count))
+                self.masks[b] = self._mask(self._grams(text))
+            first += count
+            self.pending += 1
+            if time.monotonic() >= deadline:
+                break
+        return self.done
+
+    def candidates(self, query):
+        ranges = []
+        qmask = self._mask(self._grams(query)) if len(query) >= 3 else 0
+        first = 0
+        for count, mask in zip(self.counts, self.masks):
+            if mask is None or mask & qmask == qmask:
+                if ranges and ranges[-1][1] == first:
+                    ranges[-1] = (ranges[-1][0], first + count)
+                else:
+                    ranges.append((first, first + count))
+            first += count
+        return ranges
@@ -0,0 +1,69 @@
+import codecs
+import os
+import signal
+import subprocess
+
+class ShellCommand:
+    READ = 65536
+
+    def __init__(self, cmd, cwd, loop):
+        self.cmd = cmd
+        self.loop = loop
+        self.lines = []
+        self.partial = ""
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.returncode = None
+        self.cancelled = False
+        self.done = False
+        self.proc = subprocess.Popen(
+            cmd, shell=True, cwd=cwd, stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+        self.fd = self.proc.stdout.fileno()
+        os.set_blocking(self.fd, False)
+        loop.add_reader(self.fd, self._read)
+
+    def _read(self, fd):
+        try:
+            data = os.read(fd, self.READ)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if data:
+            self._feed(self.decoder.decode(data))
+            return
+        self._feed(self.decoder.decode(b"", True))
+        if self.partial:
+            self.lines.append(self.partial)
+            self.partial = ""
+        self.loop.remove_reader(fd)
+        self.proc.stdout.close()
+        self._reap()
+
+    def _feed(self, text):
+        parts = (self.partial + text).split("\n")
+        self.partial = parts.pop()
+        self.lines.extend(p[:-1] if p.endswith("\r") else p for p in parts)
+
+    def _reap(self):
+        self.returncode = self.proc.poll()
+        if self.returncode is None:
+            self.loop.call_later(0.1, self._reap)
+            return
+        self.done = True
+        self.loop.wake()
+
+    def drain(self):
+        lines = self.lines
+        self.lines = []
+        return lines
+
+    def cancel(self):
+        if self.done or self.cancelled:
+            return
+        self.cancelled = True
+        try:
+            os.killpg(self.proc.pid, signal.SIGTERM)
+        except OSError:
+            pass
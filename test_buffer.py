@@ -0,0 +1,102 @@
+import os
+import tracemalloc
+from buffer import Buffer
+
+def make(lines):
+    buf = Buffer()
+    buf.lines = list(lines)
+    return buf
+
+def test_substitute_undo_redo():
+    buf = make(["a,b", "c", "d,e"])
+    assert buf.substitute(",", "-") == (2, 2)
+    assert list(buf.lines) == ["a-b", "c", "d-e"]
+    buf.undo()
+    assert list(buf.lines) == ["a,b", "c", "d,e"]
+    buf.redo()
+    assert list(buf.lines) == ["a-b", "c", "d-e"]
+
+def test_substitute_newline_single_line_undo():
+    buf = make(["a,b", "c", "d"])
+    buf.substitute(",", "\n", 0, 1)
+    assert list(buf.lines) == ["a", "b", "c", "d"]
+    buf.undo()
+    assert list(buf.lines) == ["a,b", "c", "d"]
+
+def test_substitute_newline_many_lines_undo_redo():
+    buf = make(["a,b", "c", "d,e,f", "g"])
+    assert buf.substitute(",", "\n", count=0) == (3, 2)
+    after = ["a", "b", "c", "d", "e", "f", "g"]
+    assert list(buf.lines) == after
+    buf.undo()
+    assert list(buf.lines) == ["a,b", "c", "d,e,f", "g"]
+    buf.redo()
+    assert list(buf.lines) == after
+
+def test_drop_lines_bounds_memory():
+    tracemalloc.start()
+    try:
+        buf = make([""])
+        base = tracemalloc.get_traced_memory()[0]
+        for i in range(200):
+            buf.append_lines([f"line {i} {j}" for j in range(100)])
+            excess = len(buf.lines) - 1 - 1000
+            if excess > 0:
+                buf.drop_lines(1, 1 + excess)
+        grown = tracemalloc.get_traced_memory()[0] - base
+    finally:
+        tracemalloc.stop()
+    assert len(buf.lines) == 1001
+    assert buf.lines[1] == "line 190 0"
+    assert buf.lines[-1] == "line 199 99"
+    assert grown < 512 * 1024
+
+def test_modified_tracks_undo_back_to_save(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("abc\n" * 100)
+    buf = Buffer(str(path))
+    assert not buf.modified
+    for i in range(5):
+        buf.insert_text(0, i, "x")
+        assert buf.modified
+    while buf.undo_stack:
+        buf.undo()
+    assert not buf.modified
+    buf.redo()
+    assert buf.modified
+    buf.save_file()
+    assert not buf.modified
+    buf.insert_text(1, 0, "y")
+    assert buf.modified
+    buf.undo()
+    assert not buf.modified
+    buf.undo()
+    assert buf.modified
+
+def test_mapped_file_truncated_while_open(tmp_path, monkeypatch):
+    monkeypatch.setattr(Buffer, "MMAP_THRESHOLD", 1)
+    path = tmp_path / "big.log"
+    path.write_text("".join(f"line {i}\n" for i in range(50000)))
+    buf = Buffer(str(path))
+    assert buf.lines[49999] == "line 49999"
+    os.truncate(path, 0)
+    assert buf.lines[30000] == ""
+    assert buf.lines[10:12] == ["", ""]
+
+def test_mapped_file_reload_after_append(tmp_path, monkeypatch):
+    monkeypatch.setattr(Buffer, "MMAP_THRESHOLD", 1)
+    path = tmp_path / "big.log"
+    path.write_text("".join(f"line {i}\n" for i in range(50000)))
+    buf = Buffer(str(path))
+    mapped = buf.mapped
+    with open(path, "a") as f:
+        f.write("tail 1\ntail 2\n")
+    buf.reload()
+    buf.lines.ensure()
+    assert buf.mapped is mapped
+    assert buf.lines[-1] == "tail 2"
+    assert len(buf.lines) == 50002
+    path.write_text("short\n")
+    buf.reload()
+    assert buf.mapped is not mapped and mapped.closed
+    assert list(buf.lines) == ["short"]
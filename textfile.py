@@ -0,0 +1,111 @@
+import codecs
+import os
+import stat
+import tempfile
+
+CHUNK = 1 << 20
+SNIFF = 64 * 1024
+
+class TextFormat:
+    __slots__ = ("encoding", "newline", "final_newline")
+
+    def __init__(self, encoding="utf-8", newline="\n", final_newline=True):
+        self.encoding = encoding
+        self.newline = newline
+        self.final_newline = final_newline
+
+def detect_format(head, tail=None):
+    tail = head if tail is None else tail
+    encoding = "utf-8-sig" if head.startswith(codecs.BOM_UTF8) else "utf-8"
+    end = head.find(b"\n")
+    newline = "\r\n" if end > 0 and head[end - 1:end] == b"\r" else "\n"
+    return TextFormat(encoding, newline, tail.endswith(b"\n"))
+
+def sniff_format(path):
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF)
+            size = f.seek(0, 2)
+            if size > SNIFF:
+                f.seek(size - 1)
+                return detect_format(head, f.read(1))
+    except OSError:
+        return TextFormat()
+    return detect_format(head)
+
+def read_lines(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    fmt = detect_format(data)
+    try:
+        text = data.decode(fmt.encoding)
+    except UnicodeDecodeError:
+        fmt.encoding = "latin-1"
+        text = data.decode(fmt.encoding)
+    if "\r\n" in text:
+        text = text.replace("\r\n", "\n")
+    lines = text.split("\n")
+    if fmt.final_newline:
+        lines.pop()
+    return lines or [""], fmt
+
+def _new_file_mode():
+    mask = os.umask(0)
+    os.umask(mask)
+    return 0o666 & ~mask
+
+def write_lines(path, lines, fmt, chunk=CHUNK):
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+    encoder = codecs.getincrementalencoder(fmt.encoding)("surrogateescape")
+    fd, tmp = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tedit~", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            parts = []
+            size = 0
+            first = True
+            for line in lines:
+                parts.append(line)
+                size += len(line) + 1
+                if size >= chunk:
+                    f.write(encoder.encode(fmt.newline.join(parts) if first else fmt.newline + fmt.newline.join(parts)))
+                    parts = []
+                    size = 0
+                    first = False
+            if parts:
+                f.write(encoder.encode(fmt.newline.join(parts) if first else fmt.newline + fmt.newline.join(parts)))
+                first = False
+            if fmt.final_newline and not first:
+                f.write(encoder.encode(fmt.newline))
+            f.write(encoder.encode("", True))
+            f.flush()
+            os.fsync(f.fileno())
+        if st is not None:
+            os.chmod(tmp, stat.S_IMODE(st.st_mode))
+            try:
+                os.chown(tmp, st.st_uid, st.st_gid)
+            except OSError:
+                pass
+        else:
+            os.chmod(tmp, _new_file_mode())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    try:
+        dirfd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dirfd)
+    except OSError:
+        pass
+    finally:
+        os.close(dirfd)
@@ -0,0 +1,98 @@
+from collections import deque
+
+def text_end(y, x, text):
+    newlines = text.count("\n")
+    if newlines == 0:
+        return y, x + len(text)
+    return y + newlines, len(text) - text.rfind("\n") - 1
+
+class Edit:
+    __slots__ = ("y", "x", "removed", "inserted")
+
+    def __init__(self, y, x, removed, inserted):
+        self.y = y
+        self.x = x
+        self.removed = removed
+        self.inserted = inserted
+
+    def size(self):
+        return len(self.removed) + len(self.inserted) + 64
+
+    def merge(self, edit):
+        if self.removed == "" and edit.removed == "":
+            if (edit.y, edit.x) == text_end(self.y, self.x, self.inserted):
+                self.inserted += edit.inserted
+                return True
+        elif self.inserted == "" and edit.inserted == "":
+            if text_end(edit.y, edit.x, edit.removed) == (self.y, self.x):
+                self.removed = edit.removed + self.removed
+                self.y, self.x = edit.y, edit.x
+                return True
+        if self.removed == "" and edit.inserted == "" and edit.removed and self.inserted.endswith(edit.removed):
+            if text_end(edit.y, edit.x, edit.removed) == text_end(self.y, self.x, self.inserted):
+                self.inserted = self.inserted[:-len(edit.removed)]
+                return True
+        return False
+
+    def __repr__(self):
+        return f"Edit({self.y}, {self.x}, {self.removed!r}, {self.inserted!r})"
+
+class UndoHistory:
+    def __init__(self, limit=16 * 1024 * 1024):
+        self.limit = limit
+        self.undo_stack = deque()
+        self.redo_stack = deque()
+        self.size = 0
+        self.open = False
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+        self.open = False
+
+    def record(self, edit, coalesce=False):
+        self._drop(self.redo_stack)
+        if coalesce and self.open and self.undo_stack:
+            last = self.undo_stack[-1][-1]
+            before = last.size()
+            if last.merge(edit):
+                self.size += last.size() - before
+                self._trim()
+                return
+        self.record_step([edit])
+        self.open = coalesce
+
+    def record_step(self, edits):
+        self._drop(self.redo_stack)
+        self.undo_stack.append(edits)
+        self.size += sum(edit.size() for edit in edits)
+        self.open = False
+        self._trim()
+
+    def break_group(self):
+        self.open = False
+
+    def pop_undo(self):
+        self.open = False
+        if not self.undo_stack:
+            return None
+        step = self.undo_stack.pop()
+        self.redo_stack.append(step)
+        return step
+
+    def pop_redo(self):
+        self.open = False
+        if not self.redo_stack:
+            return None
+        step = self.redo_stack.pop()
+        self.undo_stack.append(step)
+        return step
+
+    def _drop(self, stack):
+        while stack:
+            self.size -= sum(edit.size() for edit in stack.pop())
+
+    def _trim(self):
+        while self.size > self.limit and len(self.undo_stack) > 1:
+            self.size -= sum(edit.size() for edit in self.undo_stack.popleft())